@@ -6,6 +6,7 @@ class GridPegSolitairePuzzle(Puzzle):
     Snapshot of peg solitaire on a rectangular grid. May be solved,
     unsolved, or even unsolvable.
     """
+    __slots__ = ("_marker", "_marker_set")
 
     def __init__(self, marker, marker_set):
         """
@@ -43,6 +44,32 @@ class GridPegSolitairePuzzle(Puzzle):
             return False
         return self._marker == other._marker
 
+    def __hash__(self):
+        """Returns a hash consistent with __eq__.
+
+        @rtype: int
+        """
+        return hash(self.state_key())
+
+    def state_key(self):
+        """Returns an int with bit i set iff the i-th cell, row by row, has a peg.
+
+        Unused cells never change, so pegs alone tell configurations of
+        the same board apart.
+
+        @rtype: int
+        >>> test = GridPegSolitairePuzzle([["*","*","."]], {"*", ".", "#"})
+        >>> test.state_key()
+        3
+        """
+        key, bit = 0, 1
+        for row in self._marker:
+            for column in row:
+                if column == '*':
+                    key |= bit
+                bit <<= 1
+        return key
+
     def __str__(self):
         result = ''
         for row in self._marker:
@@ -69,76 +96,35 @@ class GridPegSolitairePuzzle(Puzzle):
         return result
 
     def extensions(self):
-        """Returns a list of extensions from the current configuration.
+        """Yields the extensions of the current configuration, one jump at a
+        time, copying the grid only for jumps that are legal.
 
-        @rtype: list[GridPegSolitarePuzzle]
+        @rtype: generator[GridPegSolitarePuzzle]
         >>> test = GridPegSolitairePuzzle([["*",".","."]], {"*", ".", "#"})
-        >>> test.extensions()
+        >>> list(test.extensions())
         []
+        >>> test = GridPegSolitairePuzzle([["*","*","."]], {"*", ".", "#"})
+        >>> [e.__repr__() for e in test.extensions()]
+        ['..*']
         """
-
-        extension_list = []
-
-        def check_up(position):
-            if position[0] > 1:
-                #  Ensure resulting peg is on the board.
-                up = [a[:] for a in self._marker]
-                #  Copy the puzzle grid
-                if up[position[0] - 1][position[1]] == '*' and up[position[0] - 2][position[1]] == '.':
-                    up[position[0] - 2][position[1]] = '*'
-                    up[position[0] - 1][position[1]] = '.'
-                    up[position[0]][position[1]] = '.'
-                    #  Make the move on the resulting grid
-                    return GridPegSolitairePuzzle(up,self._marker_set)
-
-        def check_down(position):
-            if position[0] < len(self._marker) - 2:
-                #  Ensure resulting peg is on the board.
-                down = [a[:] for a in self._marker]
-                #  Copy the puzzle grid
-                if down[position[0] + 1][position[1]] == '*' and down[position[0] + 2][position[1]] == '.':
-                    down[position[0] + 2][position[1]] = '*'
-                    down[position[0] + 1][position[1]] = '.'
-                    down[position[0]][position[1]] = '.'
-                    #  Make the move on the resulting grid
-                    return GridPegSolitairePuzzle(down, self._marker_set)
-
-        def check_left(position):
-            if position[1] > 1:
-                #  Ensure resulting peg is on the board.
-                left = [a[:] for a in self._marker]
-                #  Copy the puzzle grid
-                if left[position[0]][position[1] - 1] == '*' and left[position[0]][position[1] - 2] == '.':
-                    left[position[0]][position[1] - 2] = '*'
-                    left[position[0]][position[1] - 1] = '.'
-                    left[position[0]][position[1]] = '.'
-                    #  Make the move on the resulting grid
-                    return GridPegSolitairePuzzle(left, self._marker_set)
-
-        def check_right(position):
-            if position[1] < len(self._marker) - 2:
-                #  Ensure resulting peg is on the board.
-                right = [a[:] for a in self._marker]
-                #  Copy the puzzle grid
-                if right[position[0]][position[1] + 1] == '*' and right[position[0]][position[1] + 2] == '.':
-                    right[position[0]][position[1] + 2] = '*'
-                    right[position[0]][position[1] + 1] = '.'
-                    right[position[0]][position[1]] = '.'
-                    #  Make the move on the resulting grid
-                    return GridPegSolitairePuzzle(right, self._marker_set)
-
-        for y in range(len(self._marker)):
-            for x in range(len(self._marker[0])):
-                check = [y,x]
-                #  iterate through all the pieces on the board and check each peg.
-                if self._marker[y][x] == '*':
-                    extension_list.append(check_up(check))
-                    extension_list.append(check_down(check))
-                    extension_list.append(check_left(check))
-                    extension_list.append(check_right(check))
-        while None in extension_list:
-            extension_list.remove(None)
-        return list(extension_list)
+        marker = self._marker
+        height, width = len(marker), len(marker[0])
+        for y in range(height):
+            for x in range(width):
+                if marker[y][x] == '*':
+                    #  iterate through all the pegs on the board
+                    for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                        to_y, to_x = y + 2 * dy, x + 2 * dx
+                        if (0 <= to_y < height and 0 <= to_x < width and
+                                marker[y + dy][x + dx] == '*' and
+                                marker[to_y][to_x] == '.'):
+                            #  Jump over a peg into an empty hole on the board.
+                            jumped = [a[:] for a in marker]
+                            jumped[to_y][to_x] = '*'
+                            jumped[y + dy][x + dx] = '.'
+                            jumped[y][x] = '.'
+                            yield GridPegSolitairePuzzle(jumped,
+                                                         self._marker_set)
 
     # TODO
     # override is_solved
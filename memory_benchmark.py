@@ -0,0 +1,99 @@
+"""
+Measure the memory each word-ladder search state takes.
+
+Compares WordLadderPuzzle, which keeps only its word and a shared
+context in __slots__, against the earlier layout of one __dict__ per
+puzzle holding the word, target, word set and alphabet, with each state
+wrapped in a PuzzleNode that has its own __dict__ and children list.
+"""
+import tracemalloc
+from word_ladder_puzzle import WordLadderPuzzle, load_word_set
+from puzzle_tools import PuzzleNode
+
+
+class DictWordLadderPuzzle:
+    """
+    The earlier WordLadderPuzzle layout, for comparison.
+    """
+
+    def __init__(self, from_word, to_word, ws):
+        """
+        Create a new DictWordLadderPuzzle self like the old constructor.
+
+        @type self: DictWordLadderPuzzle
+        @type from_word: str
+        @type to_word: str
+        @type ws: set[str]
+        @rtype: None
+        """
+        (self._from_word, self._to_word, self._word_set) = (from_word,
+                                                            to_word, ws)
+        self._chars = "abcdefghijklmnopqrstuvwxyz"
+
+
+class DictPuzzleNode:
+    """
+    The earlier PuzzleNode layout, for comparison.
+    """
+
+    def __init__(self, puzzle=None, children=None, parent=None):
+        """
+        Create a new DictPuzzleNode self like the old constructor.
+
+        @type self: DictPuzzleNode
+        @type puzzle: object
+        @type children: list | None
+        @type parent: DictPuzzleNode | None
+        @rtype: None
+        """
+        self.puzzle, self.parent = puzzle, parent
+        self.children = [] if children is None else children[:]
+
+
+def bytes_per_state(make_state, words):
+    """
+    Return the average bytes allocated by make_state(word, parent) for
+    each of words, each state having the one before it as parent.
+
+    @type make_state: (str, object) -> object
+    @type words: list[str]
+    @rtype: float
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states, parent = [], None
+    for word in words:
+        parent = make_state(word, parent)
+        states.append(parent)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(words)
+
+
+if __name__ == "__main__":
+    word_set = load_word_set("words")
+    words = sorted(word_set)
+    #  Puzzles share the word objects, as the solvers' extensions do.
+    WordLadderPuzzle(words[0], "cost", word_set)
+
+    def old_state(word, parent):
+        return DictPuzzleNode(DictWordLadderPuzzle(word, "cost", word_set),
+                              None, parent)
+
+    def old_record(word, parent):
+        return DictWordLadderPuzzle(word, "cost", word_set), parent
+
+    def new_node(word, parent):
+        return PuzzleNode(WordLadderPuzzle(word, "cost", word_set),
+                          None, parent)
+
+    def new_record(word, parent):
+        return WordLadderPuzzle(word, "cost", word_set), parent
+
+    for name, make_state in [("dict puzzle in dict PuzzleNode", old_state),
+                             ("dict puzzle in (puzzle, parent)", old_record),
+                             ("slotted puzzle in PuzzleNode", new_node),
+                             ("slotted puzzle in (puzzle, parent)",
+                              new_record)]:
+        print("{}: {:.1f} bytes per state".format(
+            name, bytes_per_state(make_state, words)))
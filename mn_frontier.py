@@ -0,0 +1,125 @@
+"""
+Breadth-first search of small MNPuzzles a whole layer at a time.
+
+Each layer of the search is a NumPy array with one row of symbol codes
+per configuration, and the moves of "*" are applied to every row at once.
+Configurations are packed into one uint64 each, the same int MNPuzzle
+uses as its state_key, and duplicates are dropped with sorted-array
+operations instead of a Python set.  This needs NumPy, and boards whose
+packed configurations fit in 64 bits, such as 3x3 and 2x4.
+"""
+import numpy as np
+from mn_puzzle import _packed
+from puzzle_tools import _build_path, breadth_first_solve
+
+
+def frontier_breadth_first_solve(puzzle):
+    """
+    Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+    a solution, with each child PuzzleNode containing an extension
+    of the puzzle in its parent, or None if there is none.  Boards too
+    big to pack into 64 bits are solved by breadth_first_solve.
+
+    @type puzzle: MNPuzzle
+    @rtype: PuzzleNode | None
+
+    >>> from mn_puzzle import MNPuzzle
+    >>> target = (("1", "2", "3"), ("4", "5", "*"))
+    >>> path = frontier_breadth_first_solve(
+    ...     MNPuzzle((("*", "2", "3"), ("1", "4", "5")), target))
+    >>> path.puzzle
+    *23
+    145
+    >>> while path.children:
+    ...     path = path.children[0]
+    >>> path.puzzle
+    123
+    45*
+    """
+    layout = puzzle._layout
+    size = layout.n * layout.m
+    if puzzle._blank is None or size * layout.width > 64:
+        return breadth_first_solve(puzzle)
+    if puzzle.fail_fast():
+        return None
+    if puzzle.is_solved():
+        return _build_path([puzzle])
+
+    shifts = np.arange(size, dtype=np.uint64) * np.uint64(layout.width)
+    # (cell "*" moves to, or -1) for "*" at each cell, one column per
+    # direction
+    moves = np.full((size, 4), -1, dtype=np.int64)
+    for cell, steps in enumerate(layout.steps):
+        for move, to in steps:
+            moves[cell, [(-1, 0), (1, 0), (0, -1), (0, 1)].index(move)] = to
+
+    def pack(codes):
+        return (codes.astype(np.uint64) << shifts).sum(axis=1,
+                                                      dtype=np.uint64)
+
+    cells = puzzle._cells
+    codes = np.array([[(cells >> (i * layout.width)) & layout.mask
+                       for i in range(size)]], dtype=np.uint8)
+    blanks = np.array([puzzle._blank], dtype=np.int64)
+    keys = pack(codes)
+    goal = np.uint64(layout.goal)
+    # per layer: packed configurations, sorted; their "*" cells; and the
+    # position of each one's parent in the layer before
+    layers = [(keys, blanks, np.zeros(1, dtype=np.int64))]
+    previous = np.zeros(0, dtype=np.uint64)
+
+    while len(keys):
+        parents, children, child_blanks = [], [], []
+        for direction in range(4):
+            to = moves[blanks, direction]
+            rows = np.nonzero(to >= 0)[0]
+            child = codes[rows]
+            at, blank = np.arange(len(rows)), blanks[rows]
+            child[at, blank] = child[at, to[rows]]
+            child[at, to[rows]] = 0
+            parents.append(rows)
+            children.append(child)
+            child_blanks.append(to[rows])
+        parents = np.concatenate(parents)
+        codes = np.concatenate(children)
+        blanks = np.concatenate(child_blanks)
+        child_keys = pack(codes)
+
+        #  Neighbours of this layer are in the layers either side of it
+        #  or in it, so only those two are checked.
+        child_keys, first = np.unique(child_keys, return_index=True)
+        new = ~(np.isin(child_keys, keys, assume_unique=True) |
+                np.isin(child_keys, previous, assume_unique=True))
+        first = first[new]
+        previous, keys = keys, child_keys[new]
+        codes, blanks, parents = codes[first], blanks[first], parents[first]
+        layers.append((keys, blanks, parents))
+
+        found = np.nonzero(keys == goal)[0]
+        if len(found):
+            puzzles, i = [], found[0]
+            for keys, blanks, parents in reversed(layers):
+                puzzles.append(_packed(int(keys[i]), int(blanks[i]), layout,
+                                       True))
+                i = parents[i]
+            return _build_path(puzzles[::-1])
+    return None
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+    from time import time
+    from mn_puzzle import MNPuzzle
+
+    target_grid = (("1", "2", "3"), ("4", "5", "6"), ("7", "8", "*"))
+    start_grid = (("8", "6", "7"), ("2", "5", "4"), ("3", "*", "1"))
+    for solve in [breadth_first_solve, frontier_breadth_first_solve]:
+        start = time()
+        solution = solve(MNPuzzle(start_grid, target_grid))
+        end = time()
+        moves = 0
+        while solution.children:
+            solution, moves = solution.children[0], moves + 1
+        print("{}: {} moves in {} seconds".format(solve.__name__, moves,
+                                                  end - start))
@@ -1,11 +1,131 @@
 from puzzle import Puzzle
+from bisect import bisect_left
+
+# _MNLayouts already built, by (to_grid, extra symbols)
+_layouts = {}
+
+
+class _MNLayout:
+    """
+    What every MNPuzzle working towards the same to_grid shares: the code
+    of each symbol, where each code belongs, and the moves of "*" from each
+    cell.
+    """
+    __slots__ = ("to_grid", "extra", "n", "m", "symbols", "codes", "width",
+                 "mask", "goal", "goal_blank", "targets", "goal_cells",
+                 "distinct", "steps")
+
+    def __init__(self, to_grid, extra):
+        """
+        Create a new _MNLayout self for to_grid, giving codes as well to
+        the extra symbols that appear in a from_grid but not in to_grid.
+
+        @type self: _MNLayout
+        @type to_grid: tuple[tuple[str]]
+        @type extra: tuple[str]
+        @rtype: None
+        """
+        self.to_grid, self.extra = to_grid, extra
+        self.n, self.m = len(to_grid), len(to_grid[0])
+        # "*" is always code 0, so a move never has to write it
+        self.symbols = ["*"]
+        for row in to_grid:
+            for symbol in row:
+                if symbol not in self.symbols:
+                    self.symbols.append(symbol)
+        self.symbols.extend(extra)
+        self.codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+        self.width = max(1, (len(self.symbols) - 1).bit_length())
+        self.mask = (1 << self.width) - 1
+
+        # goal (row, column) of each code, None for the extra symbols, and
+        # every goal (row, column) of each code, for repeated symbols
+        self.targets = [None] * len(self.symbols)
+        self.goal_cells = [[] for _ in self.symbols]
+        for y in range(self.n):
+            for x in range(self.m):
+                self.targets[self.codes[to_grid[y][x]]] = (y, x)
+                self.goal_cells[self.codes[to_grid[y][x]]].append((y, x))
+        self.goal, self.goal_blank = self.pack(to_grid)
+        # whether each symbol, "*" included, appears in to_grid exactly once
+        self.distinct = (len(self.symbols) - len(extra) == self.n * self.m)
+
+        # (move, cell "*" moves to) for "*" at each cell
+        self.steps = []
+        for i in range(self.n * self.m):
+            y, x = divmod(i, self.m)
+            self.steps.append([((dy, dx), i + dy * self.m + dx) for dy, dx in
+                               [(-1, 0), (1, 0), (0, -1), (0, 1)]
+                               if 0 <= y + dy < self.n and
+                               0 <= x + dx < self.m])
+
+    def __reduce__(self):
+        """
+        Pickle _MNLayout self as its key, so the process that unpickles it
+        shares its own copy.
+
+        @type self: _MNLayout
+        @rtype: tuple
+        """
+        return _layout, (self.to_grid, self.extra)
+
+    def pack(self, grid):
+        """
+        Return grid packed into one int, width bits per cell, and the cell
+        number of its "*", or None if it has none.
+
+        @type self: _MNLayout
+        @type grid: tuple[tuple[str]]
+        @rtype: (int, int | None)
+        """
+        cells, blank, shift = 0, None, 0
+        for row in grid:
+            for symbol in row:
+                if symbol == "*":
+                    blank = shift // self.width
+                cells |= self.codes[symbol] << shift
+                shift += self.width
+        return cells, blank
+
+    def unpack(self, cells):
+        """
+        Return the grid packed in cells.
+
+        @type self: _MNLayout
+        @type cells: int
+        @rtype: tuple[tuple[str]]
+        """
+        grid = []
+        for _ in range(self.n):
+            row = []
+            for _ in range(self.m):
+                row.append(self.symbols[cells & self.mask])
+                cells >>= self.width
+            grid.append(tuple(row))
+        return tuple(grid)
+
+
+def _layout(to_grid, extra=()):
+    # Return the shared _MNLayout for to_grid and extra symbols.
+    #
+    # @type to_grid: tuple[tuple[str]]
+    # @type extra: tuple[str]
+    # @rtype: _MNLayout
+    layout = _layouts.get((to_grid, extra))
+    if layout is None:
+        layout = _layouts[(to_grid, extra)] = _MNLayout(to_grid, extra)
+    return layout
 
 
 class MNPuzzle(Puzzle):
     """
     An nxm puzzle, like the 15-puzzle, which may be solved, unsolved,
     or even unsolvable.
+
+    The grid is kept packed into one int, a few bits per cell, with the
+    cell of "*" beside it; from_grid unpacks it when asked.
     """
+    __slots__ = ("_cells", "_blank", "_layout", "_solvable")
 
     def __init__(self, from_grid, to_grid):
         """
@@ -22,8 +142,60 @@ class MNPuzzle(Puzzle):
         assert len(from_grid) > 0
         assert all([len(r) == len(from_grid[0]) for r in from_grid])
         assert all([len(r) == len(to_grid[0]) for r in to_grid])
-        self.n, self.m = len(from_grid), len(from_grid[0])
-        self.from_grid, self.to_grid = from_grid, to_grid
+        assert len(from_grid) == len(to_grid)
+        assert len(from_grid[0]) == len(to_grid[0])
+        to_grid = tuple([tuple(row) for row in to_grid])
+        known = {symbol for row in to_grid for symbol in row}
+        extra = {symbol for row in from_grid for symbol in row
+                 if symbol not in known and symbol != "*"}
+        self._layout = _layout(to_grid, tuple(sorted(extra, key=repr)))
+        self._cells, self._blank = self._layout.pack(from_grid)
+        # whether to_grid can be reached, once fail_fast has worked it out;
+        # no move changes it, so extensions pass it on
+        self._solvable = None
+
+    @property
+    def n(self):
+        """Returns the number of rows.
+
+        @rtype: int
+        """
+        return self._layout.n
+
+    @property
+    def m(self):
+        """Returns the number of columns.
+
+        @rtype: int
+        """
+        return self._layout.m
+
+    @property
+    def to_grid(self):
+        """Returns the solution configuration.
+
+        @rtype: tuple[tuple[str]]
+        """
+        return self._layout.to_grid
+
+    @property
+    def from_grid(self):
+        """Returns the current configuration, unpacked.
+
+        @rtype: tuple[tuple[str]]
+        >>> MNPuzzle([["1", "*"], ["2", "3"]], [["1", "2"], ["3", "*"]]).from_grid
+        (('1', '*'), ('2', '3'))
+        """
+        return self._layout.unpack(self._cells)
+
+    @from_grid.setter
+    def from_grid(self, grid):
+        """Makes grid the current configuration.
+
+        @type grid: tuple[tuple[str]]
+        @rtype: None
+        """
+        self.__init__(grid, self.to_grid)
 
     # TODO
     # implement __eq__ and __str__
@@ -40,8 +212,28 @@ class MNPuzzle(Puzzle):
         >>> test = copy
         False
         """
-        return self.from_grid == other.from_grid and self.to_grid == other.to_grid
-    
+        #  Equal grids with the same to_grid have the same symbols, so the
+        #  same layout.
+        return (isinstance(other, MNPuzzle) and
+                self._cells == other._cells and
+                self._layout is other._layout)
+
+    def __hash__(self):
+        """Returns a hash consistent with __eq__.
+
+        @rtype: int
+        """
+        return hash(self._cells)
+
+    def state_key(self):
+        """Returns from_grid packed into one int.
+
+        @rtype: int
+        >>> MNPuzzle((("1", "*"), ("2", "3")), (("1", "2"), ("3", "*"))).state_key()
+        225
+        """
+        return self._cells
+
     def __repr__(self):
         """Returns an unambiguous string representation of the puzzle
         >>> test = MNPuzzle([1,2,3,4,'*'],[1,2,3,4,'*'])
@@ -66,11 +258,140 @@ class MNPuzzle(Puzzle):
         >>> test.from_grid = [1,2,3,'*',4]
         False
         """
-        return self.from_grid == self.to_grid
+        return self._cells == self._layout.goal
+
+    def fail_fast(self):
+        """Returns true if to_grid can't be reached from from_grid.
+
+        A move of "*" is a swap of two cells that moves "*" one step, so
+        the parity of the permutation taking from_grid to to_grid always
+        matches the parity of the steps between where "*" is and where it
+        belongs.  On a single row or column the tiles can't pass each
+        other at all.  The answer is worked out once and passed on to
+        every extension.
+
+        @rtype: bool
+        >>> target = (("1", "2", "3"), ("4", "5", "6"), ("7", "8", "*"))
+        >>> MNPuzzle((("1", "2", "3"), ("4", "5", "6"), ("8", "7", "*")),
+        ...          target).fail_fast()
+        True
+        >>> MNPuzzle((("1", "2", "3"), ("4", "5", "6"), ("7", "*", "8")),
+        ...          target).fail_fast()
+        False
+        >>> MNPuzzle((("1", "2"), ("*", "3")), (("1", "2"), ("3", "*"))
+        ...          ).fail_fast()
+        False
+        >>> MNPuzzle((("2", "*", "1"),), (("1", "2", "*"),)).fail_fast()
+        True
+        """
+        if self._solvable is None:
+            self._solvable = _solvable(self._cells, self._blank, self._layout)
+        return not self._solvable
+
+    def is_reversible(self):
+        """Sliding a tile back undoes every move.
+
+        @rtype: bool
+        """
+        return True
+
+    def goal(self):
+        """Returns the MNPuzzle already in state to_grid.
+
+        @rtype: MNPuzzle
+        """
+        return _packed(self._layout.goal, self._layout.goal_blank,
+                       self._layout, True)
+
+    def heuristic(self):
+        """Returns the Manhattan distance of every tile from its place in
+        to_grid, plus 2 for each tile that must step out of its goal row or
+        column to let another tile past it (linear conflict).  For a pattern
+        database instead, pass PatternDatabase.heuristic to the solver.
+        When to_grid repeats a symbol, each tile counts only the distance
+        to the nearest cell of its symbol, without linear conflict.
+
+        @rtype: int
+        >>> target = (("1", "2", "3"), ("4", "5", "*"))
+        >>> MNPuzzle((("1", "2", "3"), ("4", "*", "5")), target).heuristic()
+        1
+        >>> MNPuzzle((("2", "1", "3"), ("4", "5", "*")), target).heuristic()
+        4
+        >>> MNPuzzle((("1", "3", "2"), ("1", "3", "*")),
+        ...          (("1", "1", "2"), ("3", "*", "3"))).heuristic()
+        4
+        """
+        layout = self._layout
+        if not layout.distinct:
+            return _nearest_goal_distance(self._cells, layout)
+        targets, mask, width = layout.targets, layout.mask, layout.width
+        cells = self._cells
+        distance = 0
+        #  goal columns of tiles already in their goal row, and vice versa
+        rows = [[] for _ in range(layout.n)]
+        columns = [[] for _ in range(layout.m)]
+        for y in range(layout.n):
+            for x in range(layout.m):
+                code = cells & mask
+                cells >>= width
+                #  symbols missing from to_grid have no goal
+                if code and targets[code] is not None:
+                    goal_y, goal_x = targets[code]
+                    distance += abs(goal_y - y) + abs(goal_x - x)
+                    if goal_y == y:
+                        rows[y].append(goal_x)
+                    if goal_x == x:
+                        columns[x].append(goal_y)
+        for line in rows + columns:
+            #  tiles outside the longest run already in goal order must
+            #  each leave the line and come back
+            distance += 2 * (len(line) - _longest_increasing_run(line))
+        return distance
+
+    def moves(self):
+        """Returns the (row, column) steps "*" can take in from_grid.
+
+        @rtype: list[tuple[int]]
+        >>> test = MNPuzzle((("1", "*"), ("2", "3")), (("1", "2"), ("3", "*")))
+        >>> test.moves()
+        [(1, 0), (0, -1)]
+        """
+        if self._blank is None:
+            return []
+        return [move for move, _ in self._layout.steps[self._blank]]
+
+    def apply_move(self, move):
+        """Slides the tile at "*" + move into "*", in place.
+
+        The tile's code is moved with two shifts and an xor.
+
+        @type move: tuple[int]
+        @rtype: None
+        >>> test = MNPuzzle((("1", "*"), ("2", "3")), (("1", "2"), ("3", "*")))
+        >>> test.apply_move((0, -1))
+        >>> test.from_grid
+        (('*', '1'), ('2', '3'))
+        >>> test.apply_move(test.inverse_move((0, -1)))
+        >>> test.from_grid
+        (('1', '*'), ('2', '3'))
+        """
+        layout = self._layout
+        to = self._blank + move[0] * layout.m + move[1]
+        self._cells = _slide(self._cells, self._blank, to, layout)
+        self._blank = to
+
+    def inverse_move(self, move):
+        """Returns the move that puts "*" back where it was before move.
+
+        @type move: tuple[int]
+        @rtype: tuple[int]
+        """
+        return -move[0], -move[1]
 
     def extensions(self):
-        """Returns a list of possible extensions to
-        @rtype: list[MNPuzzle]
+        """Yields the possible extensions, one move of "*" at a time.
+
+        @rtype: generator[MNPuzzle]
         >>> test = MNPuzzle([1,2,3,4,'*'],[1,2,3,4,'*'])
         >>> extension = test.extensions()
         >>> extension
@@ -79,80 +400,134 @@ class MNPuzzle(Puzzle):
         # override extensions
         # legal extensions are configurations that can be reached by swapping one
         # symbol to the left, right, above, or below "*" with "*"
-        open_position = [-1,-1]
-        y = 0
-        #  Change the grid to a list because tuples are immutable
-        grid_list = []
-        for row in self.from_grid:
-            grid_list.append(list(row))
-
-        while open_position[0] == -1:
-            x = 0
-            while open_position[1] == -1 and x < len(self.from_grid[y]):
-                if self.from_grid[y][x] == '*':
-                    open_position = [y, x]
-                x += 1
-            y += 1
-        possible_moves = []
-
-        def list_to_tuple(grid):
-            result = []
-            for rows in grid:
-                result.append(tuple(rows))
-            return tuple(result)
-
-        def move_left(grid,open_position):
-            left = [a[:] for a in grid]
-            y = open_position[0]
-            x = open_position[1]
-            left[y][x] = left[y][x + 1]
-            left[y][x + 1] = "*"
-            return list_to_tuple(left)
-
-        def move_right(grid,open_position):
-            right = [a[:] for a in grid]
-            y = open_position[0]
-            x = open_position[1]
-            right[y][x] = right[y][x - 1]
-            right[y][x - 1] = "*"
-            return list_to_tuple(right)
-
-        def move_up(grid,open_position):
-            up = [a[:] for a in grid]
-            y = open_position[0]
-            x = open_position[1]
-            up[y][x] = up[y + 1][x]
-            up[y + 1][x] = "*"
-            return list_to_tuple(up)
-
-        def move_down(grid,open_position):
-            down = [a[:] for a in grid]
-            y = open_position[0]
-            x = open_position[1]
-            down[y][x] = down[y - 1][x]
-            down[y - 1][x] = "*"
-            return list_to_tuple(down)
-
-        if open_position[0] != 0:
-            possible_moves.append(MNPuzzle(move_down(grid_list,open_position),self.to_grid))
-        if open_position[0] != len(self.from_grid) - 1:
-            possible_moves.append(MNPuzzle(move_up(grid_list,open_position),self.to_grid))
-        if open_position[1] != 0:
-            possible_moves.append(MNPuzzle(move_right(grid_list,open_position),self.to_grid))
-        if open_position[1] != len(self.from_grid[0]) - 1:
-            possible_moves.append(MNPuzzle(move_left(grid_list,open_position),self.to_grid))
-        return possible_moves
+        if self._blank is None:
+            return
+        layout, cells, blank = self._layout, self._cells, self._blank
+        for _, to in layout.steps[blank]:
+            yield _packed(_slide(cells, blank, to, layout), to, layout,
+                          self._solvable)
+
     # TODO
     # override is_solved
     # a configuration is solved when from_grid is the same as to_grid
 
 
+def _slide(cells, blank, to, layout):
+    # Return cells with the tile at cell to slid into "*" at cell blank.
+    #
+    # @type cells: int
+    # @type blank: int
+    # @type to: int
+    # @type layout: _MNLayout
+    # @rtype: int
+    code = (cells >> (to * layout.width)) & layout.mask
+    #  "*" is code 0, so xor clears cell to and fills cell blank.
+    return cells ^ (code << (to * layout.width)) ^ (code << (blank *
+                                                           layout.width))
+
+
+def _nearest_goal_distance(cells, layout):
+    # Return the sum, over the tiles of packed grid cells, of the
+    # Manhattan distance to the nearest goal cell of the tile's symbol.
+    # Each tile must reach one of them, so this never overestimates even
+    # when to_grid repeats symbols.
+    #
+    # @type cells: int
+    # @type layout: _MNLayout
+    # @rtype: int
+    goal_cells, mask, width = layout.goal_cells, layout.mask, layout.width
+    distance = 0
+    for y in range(layout.n):
+        for x in range(layout.m):
+            code = cells & mask
+            cells >>= width
+            if code and goal_cells[code]:
+                distance += min([abs(goal_y - y) + abs(goal_x - x)
+                                 for goal_y, goal_x in goal_cells[code]])
+    return distance
+
+
+def _solvable(cells, blank, layout):
+    # Return whether "*" at cell blank can slide packed grid cells into
+    # layout.goal.
+    #
+    # @type cells: int
+    # @type blank: int | None
+    # @type layout: _MNLayout
+    # @rtype: bool
+    if blank is None or layout.extra:
+        return cells == layout.goal
+    size = layout.n * layout.m
+    codes, goal_codes, goal = [], [], layout.goal
+    for _ in range(size):
+        codes.append(cells & layout.mask)
+        goal_codes.append(goal & layout.mask)
+        cells >>= layout.width
+        goal >>= layout.width
+    if sorted(codes) != sorted(goal_codes):
+        return False
+    if layout.n == 1 or layout.m == 1:
+        return ([code for code in codes if code] ==
+                [code for code in goal_codes if code])
+    if not layout.distinct:
+        #  Equal tiles can trade places, so parity proves nothing.
+        return True
+
+    #  goal cell of the symbol at each cell, and its cycles
+    moved_to = [layout.targets[code][0] * layout.m + layout.targets[code][1]
+                for code in codes]
+    cycles, seen = 0, [False] * size
+    for i in range(size):
+        if not seen[i]:
+            cycles += 1
+            while not seen[i]:
+                seen[i] = True
+                i = moved_to[i]
+    goal_y, goal_x = layout.targets[0]
+    steps = abs(blank // layout.m - goal_y) + abs(blank % layout.m - goal_x)
+    return (size - cycles) % 2 == steps % 2
+
+
+def _packed(cells, blank, layout, solvable=None):
+    # Return the MNPuzzle with packed grid cells and "*" at cell blank,
+    # without unpacking anything.
+    #
+    # @type cells: int
+    # @type blank: int | None
+    # @type layout: _MNLayout
+    # @type solvable: bool | None
+    # @rtype: MNPuzzle
+    puzzle = MNPuzzle.__new__(MNPuzzle)
+    puzzle._cells, puzzle._blank, puzzle._layout = cells, blank, layout
+    puzzle._solvable = solvable
+    return puzzle
+
+
+def _longest_increasing_run(sequence):
+    """Return the length of the longest increasing subsequence of sequence.
+
+    @type sequence: list[int]
+    @rtype: int
+    >>> _longest_increasing_run([2, 0, 1])
+    2
+    """
+    tails = []
+    for item in sequence:
+        i = bisect_left(tails, item)
+        if i == len(tails):
+            tails.append(item)
+        else:
+            tails[i] = item
+    return len(tails)
+
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
     target_grid = (("1", "2", "3"), ("4", "5", "*"))
     start_grid = (("*", "2", "3"), ("1", "4", "5"))
-    from puzzle_tools import breadth_first_solve, depth_first_solve
+    from puzzle_tools import breadth_first_solve, depth_first_solve, \
+        astar_solve, ida_star_solve
     from time import time
     start = time()
     solution = breadth_first_solve(MNPuzzle(start_grid, target_grid))
@@ -164,3 +539,28 @@ if __name__ == "__main__":
     end = time()
     print("DFS solved: \n\n{} \n\nin {} seconds".format(
         solution, end - start))
+    start = time()
+    solution = astar_solve(MNPuzzle(start_grid, target_grid))
+    end = time()
+    print("A* solved: \n\n{} \n\nin {} seconds".format(
+        solution, end - start))
+    start = time()
+    solution = breadth_first_solve(MNPuzzle((("2", "1", "3"), ("4", "5", "*")),
+                                            target_grid))
+    end = time()
+    print("BFS rejected an unsolvable puzzle ({}) in {} seconds".format(
+        solution, end - start))
+
+    target_grid = (("1", "2", "3", "4"), ("5", "6", "7", "8"),
+                   ("9", "A", "B", "C"), ("D", "E", "F", "*"))
+    start_grid = (("6", "5", "9", "3"), ("D", "2", "B", "A"),
+                  ("1", "8", "F", "4"), ("E", "C", "7", "*"))
+
+    def report(threshold, nodes):
+        print("IDA* threshold {}: {} nodes".format(threshold, nodes))
+    start = time()
+    solution = ida_star_solve(MNPuzzle(start_grid, target_grid),
+                              report=report)
+    end = time()
+    print("IDA* solved 15-puzzle: \n\n{} \n\nin {} seconds".format(
+        solution, end - start))
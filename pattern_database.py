@@ -0,0 +1,383 @@
+"""
+Additive pattern databases for MNPuzzle heuristics.
+
+A pattern database for a group of tiles holds, for every placement of
+those tiles, the fewest moves of those tiles alone that bring them to
+their places in to_grid, whatever the other tiles do.  Only moves of a
+group's own tiles are counted, so the distances of disjoint groups can be
+added and still never overestimate.
+
+build_pattern_database fills the tables with a breadth-first search
+backwards from to_grid and writes them to a file that open_pattern_database
+maps into memory, so every worker process reads the same pages.  The file
+is little-endian:
+
+    header      b"MNPD", version (u32), key length (u32)
+    key         UTF-8 JSON {"to_grid": [[...]], "groups": [[...]]}
+    tables      per group: offset (u64), size (u64)
+    ...         per group, one byte per placement of its tiles, numbered
+                by _rank
+
+Files are named after the board shape and a digest of the key by
+database_path, so a table is built once and then reused.  A database is
+used by passing its heuristic method to astar_solve or ida_star_solve.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+_MAGIC = b"MNPD"
+_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+_TABLE = struct.Struct("<QQ")
+# largest group default_groups makes
+_GROUP_SIZE = 5
+
+# PatternDatabases already opened in this process, by path
+_databases = {}
+
+
+def default_groups(to_grid):
+    """
+    Return the tiles of to_grid in row order, split into groups of at
+    most five, such as 5-5-5 for the 15-puzzle.
+
+    @type to_grid: tuple[tuple[str]]
+    @rtype: list[tuple[str]]
+
+    >>> default_groups((("1", "2", "3"), ("4", "5", "6"), ("7", "8", "*")))
+    [('1', '2', '3', '4'), ('5', '6', '7', '8')]
+    """
+    tiles = [symbol for row in to_grid for symbol in row if symbol != "*"]
+    count = -(-len(tiles) // _GROUP_SIZE)
+    return [tuple(tiles[len(tiles) * g // count:
+                        len(tiles) * (g + 1) // count])
+            for g in range(count)]
+
+
+def database_path(to_grid, groups, directory="."):
+    """
+    Return the path of the pattern database for to_grid and groups in
+    directory.
+
+    @type to_grid: tuple[tuple[str]]
+    @type groups: list[tuple[str]]
+    @type directory: str
+    @rtype: str
+    """
+    digest = hashlib.sha1(_key(to_grid, groups)).hexdigest()[:16]
+    return os.path.join(directory, "{}x{}-{}.mnpd".format(
+        len(to_grid), len(to_grid[0]), digest))
+
+
+def _key(to_grid, groups):
+    # Return the encoded key of the pattern database for to_grid and
+    # groups.
+    #
+    # @type to_grid: tuple[tuple[str]]
+    # @type groups: list[tuple[str]]
+    # @rtype: bytes
+    return json.dumps({"to_grid": [list(row) for row in to_grid],
+                       "groups": [list(group) for group in groups]},
+                      sort_keys=True).encode("utf-8")
+
+
+def _rank(positions, size):
+    # Return the number of the placement of tiles at cells positions,
+    # from 0 to size! / (size - len(positions))! - 1.
+    #
+    # @type positions: list[int]
+    # @type size: int
+    # @rtype: int
+    rank = 0
+    for i, position in enumerate(positions):
+        rank = rank * (size - i) + position - len(
+            [p for p in positions[:i] if p < position])
+    return rank
+
+
+def _placements(size, count):
+    # Return the number of placements of count tiles in size cells.
+    #
+    # @type size: int
+    # @type count: int
+    # @rtype: int
+    placements = 1
+    for i in range(count):
+        placements *= size - i
+    return placements
+
+
+def _table(to_grid, group):
+    # Return the fewest moves of the tiles in group that bring them to
+    # their places in to_grid, for each placement numbered by _rank.
+    #
+    # @type to_grid: tuple[tuple[str]]
+    # @type group: tuple[str]
+    # @rtype: bytearray
+    n, m = len(to_grid), len(to_grid[0])
+    size = n * m
+    cells = [symbol for row in to_grid for symbol in row]
+    full = (1 << size) - 1
+    # cells with a cell to their left, and to their right
+    has_left = sum([1 << c for c in range(size) if c % m != 0])
+    has_right = sum([1 << c for c in range(size) if c % m != m - 1])
+    neighbours = [[c + step for step, ok in
+                   [(-m, c >= m), (m, c < size - m),
+                    (-1, c % m != 0), (1, c % m != m - 1)] if ok]
+                  for c in range(size)]
+
+    def region(start, free):
+        # lowest cell "*" can reach from start through free cells, and
+        # every such cell
+        reached = 1 << start
+        while True:
+            grown = (reached | (reached << m) | (reached >> m) |
+                     ((reached & has_right) << 1) |
+                     ((reached & has_left) >> 1)) & free
+            if grown == reached:
+                return (reached & -reached).bit_length() - 1, reached
+            reached = grown
+
+    #  Moves of "*" through cells outside the group cost nothing, so a
+    #  state is the group's cells and the lowest cell "*" can reach.
+    table = bytearray([255]) * _placements(size, len(group))
+    start = [cells.index(symbol) for symbol in group]
+    occupied = sum([1 << c for c in start])
+    lowest = region(cells.index("*"), full & ~occupied)[0]
+    seen = {(tuple(start), lowest)}
+    layer, moves = [(start, lowest)], 0
+    while layer:
+        next_layer = []
+        for positions, lowest in layer:
+            rank = _rank(positions, size)
+            if table[rank] == 255:
+                table[rank] = min(moves, 254)
+            occupied = sum([1 << c for c in positions])
+            reach = region(lowest, full & ~occupied)[1]
+            for i, cell in enumerate(positions):
+                for to in neighbours[cell]:
+                    if reach >> to & 1:
+                        moved = positions[:]
+                        moved[i] = to
+                        #  "*" is now where the tile was.
+                        state = (tuple(moved), region(
+                            cell, full & ~(occupied ^ (1 << cell) ^
+                                           (1 << to)))[0])
+                        if state not in seen:
+                            seen.add(state)
+                            next_layer.append((moved, state[1]))
+        layer, moves = next_layer, moves + 1
+    return table
+
+
+def build_pattern_database(to_grid, groups, target):
+    """
+    Write the pattern database for the disjoint tile groups of to_grid to
+    the file at target, and return how many placements it holds.
+
+    @type to_grid: tuple[tuple[str]]
+    @type groups: list[tuple[str]]
+    @type target: str
+    @rtype: int
+    """
+    symbols = [symbol for row in to_grid for symbol in row]
+    assert len(set(symbols)) == len(symbols) and "*" in symbols
+    assert all([symbol in symbols and symbol != "*"
+                for group in groups for symbol in group])
+    assert len({symbol for group in groups for symbol in group}) == sum(
+        [len(group) for group in groups])
+    key = _key(to_grid, groups)
+    tables = [_table(to_grid, group) for group in groups]
+
+    offset = _HEADER.size + len(key) + _TABLE.size * len(tables)
+    layout = []
+    for table in tables:
+        layout.append(_TABLE.pack(offset, len(table)))
+        offset += len(table)
+    #  Write next to target first, so no reader maps half a file.
+    with open(target + ".tmp", "wb") as database:
+        database.write(_HEADER.pack(_MAGIC, _VERSION, len(key)))
+        database.write(key)
+        database.write(b"".join(layout))
+        for table in tables:
+            database.write(table)
+    os.replace(target + ".tmp", target)
+    return sum([len(table) for table in tables])
+
+
+def open_pattern_database(path):
+    """
+    Return the PatternDatabase at path, mapping the file only the first
+    time it is asked for in this process.
+
+    @type path: str
+    @rtype: PatternDatabase
+    """
+    database = _databases.get(path)
+    if database is None:
+        database = _databases[path] = PatternDatabase(path)
+    return database
+
+
+def pattern_database(to_grid, groups=None, directory="."):
+    """
+    Return the PatternDatabase for groups of to_grid, or default_groups of
+    to_grid if groups is None, building its file in directory first if
+    there is none.
+
+    @type to_grid: tuple[tuple[str]]
+    @type groups: list[tuple[str]] | None
+    @type directory: str
+    @rtype: PatternDatabase
+
+    >>> import tempfile
+    >>> target = (("1", "2", "3"), ("4", "5", "*"))
+    >>> database = pattern_database(target, [("1", "2"), ("3", "4", "5")],
+    ...                             tempfile.mkdtemp())
+    >>> database.groups
+    [('1', '2'), ('3', '4', '5')]
+    >>> database.distance(1, [2, 3, 4])
+    0
+    >>> database.distance(1, [2, 4, 3])
+    8
+    >>> from mn_puzzle import MNPuzzle
+    >>> from puzzle_tools import astar_solve
+    >>> start = MNPuzzle((("*", "2", "3"), ("1", "4", "5")), target)
+    >>> database.heuristic(start)
+    3
+    >>> path, steps = astar_solve(start, database.heuristic), 0
+    >>> while path.children:
+    ...     path, steps = path.children[0], steps + 1
+    >>> steps
+    3
+    """
+    if groups is None:
+        groups = default_groups(to_grid)
+    path = database_path(to_grid, groups, directory)
+    if not os.path.exists(path):
+        build_pattern_database(to_grid, groups, path)
+    return open_pattern_database(path)
+
+
+class PatternDatabase:
+    """
+    Read-only pattern database tables for the tile groups of one to_grid,
+    backed by a memory-mapped file.
+
+    === Attributes ===
+    @type path: str
+        the file the tables are mapped from
+    @type to_grid: tuple[tuple[str]]
+        the configuration the distances are to
+    @type groups: list[tuple[str]]
+        the tiles of each table, in the order their cells are numbered
+    """
+
+    def __init__(self, path):
+        """
+        Create a new PatternDatabase self over the file at path.
+
+        @type self: PatternDatabase
+        @type path: str
+        @rtype: None
+        """
+        self.path = path
+        with open(path, "rb") as database:
+            self._map = mmap.mmap(database.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, version, length = _HEADER.unpack_from(self._map, 0)
+        assert magic == _MAGIC and version == _VERSION
+        key = json.loads(self._map[_HEADER.size:_HEADER.size + length]
+                         .decode("utf-8"))
+        self.to_grid = tuple([tuple(row) for row in key["to_grid"]])
+        self.groups = [tuple(group) for group in key["groups"]]
+        self._size = len(self.to_grid) * len(self.to_grid[0])
+        # offset of each group's table
+        self._offsets = [_TABLE.unpack_from(
+            self._map, _HEADER.size + length + g * _TABLE.size)[0]
+            for g in range(len(self.groups))]
+        # codes of each group's tiles, by the _MNLayout they are codes of
+        self._codes = {}
+
+    def __reduce__(self):
+        """
+        Pickle PatternDatabase self as its path, so the file is mapped
+        again, not copied, by the process that unpickles it.
+
+        @type self: PatternDatabase
+        @rtype: tuple
+        """
+        return open_pattern_database, (self.path,)
+
+    def distance(self, group, positions):
+        """
+        Return the fewest moves of the tiles of group number group, at
+        cells positions in row order, that bring them to their places.
+
+        @type self: PatternDatabase
+        @type group: int
+        @type positions: list[int]
+        @rtype: int
+        """
+        return self._map[self._offsets[group] +
+                         _rank(positions, self._size)]
+
+    def heuristic(self, puzzle):
+        """
+        Return the sum of the distances of the tile groups of MNPuzzle
+        puzzle, which must be working towards to_grid.  Pass this to
+        astar_solve or ida_star_solve as their heuristic; it pickles with
+        self, so worker processes map the same file.
+
+        @type self: PatternDatabase
+        @type puzzle: MNPuzzle
+        @rtype: int
+        """
+        layout = puzzle._layout
+        codes = self._codes.get(layout)
+        if codes is None:
+            assert layout.to_grid == self.to_grid
+            codes = self._codes[layout] = [
+                [layout.codes[symbol] for symbol in group]
+                for group in self.groups]
+        # cell of each code
+        where = [0] * len(layout.symbols)
+        cells = puzzle._cells
+        for cell in range(layout.n * layout.m):
+            where[cells & layout.mask] = cell
+            cells >>= layout.width
+        return sum([self.distance(g, [where[code] for code in group])
+                    for g, group in enumerate(codes)])
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+    import sys
+    from time import time
+    from mn_puzzle import MNPuzzle
+    from puzzle_tools import ida_star_solve
+
+    target_grid = (("1", "2", "3", "4"), ("5", "6", "7", "8"),
+                   ("9", "A", "B", "C"), ("D", "E", "F", "*"))
+    start_grid = (("6", "5", "9", "3"), ("D", "2", "B", "A"),
+                  ("1", "8", "F", "4"), ("E", "C", "7", "*"))
+    start = time()
+    pdb = pattern_database(target_grid,
+                           directory=sys.argv[1] if len(sys.argv) > 1
+                           else ".")
+    print("pattern database {} ready in {} seconds".format(
+        pdb.path, time() - start))
+
+    for name, estimate in [("Manhattan and linear conflict", None),
+                           ("pattern database", pdb.heuristic)]:
+        nodes = []
+        start = time()
+        solution = ida_star_solve(MNPuzzle(start_grid, target_grid),
+                                  estimate,
+                                  report=lambda _, count: nodes.append(count))
+        print("IDA* with {}: {} nodes in {} seconds".format(
+            name, sum(nodes), time() - start))
@@ -3,6 +3,8 @@ class Puzzle:
     Snapshot of a full-information puzzle, which may be solved, unsolved,
     or even unsolvable.
     """
+    # no per-instance __dict__, so subclasses with __slots__ stay small
+    __slots__ = ()
 
     def fail_fast(self):
         """
@@ -16,6 +18,42 @@ class Puzzle:
         """
         return False
 
+    def is_reversible(self):
+        """
+        Return True if every extension of Puzzle self can be extended
+        back to Puzzle self.
+
+        Override this, together with goal, in a subclass with a single
+        solved configuration to allow bidirectional_solve.
+
+        @type self: Puzzle
+        @rtype: bool
+        """
+        return False
+
+    def goal(self):
+        """
+        Return the solved configuration Puzzle self is working towards.
+
+        @type self: Puzzle
+        @rtype: Puzzle
+        """
+        raise NotImplementedError
+
+    def heuristic(self):
+        """
+        Return an estimate of the number of extensions needed to get from
+        Puzzle self to a solution.
+
+        Override this in a subclass to guide astar_solve; the estimate
+        must never be larger than the true number for astar_solve to
+        find the shortest solution.
+
+        @type self: Puzzle
+        @rtype: int
+        """
+        return 0
+
     def is_solved(self):
         """
         Return True iff Puzzle self is solved.
@@ -30,7 +68,8 @@ class Puzzle:
 
     def extensions(self):
         """
-        Return list of legal extensions of Puzzle self.
+        Yield the legal extensions of Puzzle self, building each one only
+        when it is asked for.
 
         This is an abstract method that must be implemented
         in a subclass.
@@ -39,3 +78,58 @@ class Puzzle:
         @rtype: generator[Puzzle]
         """
         raise NotImplementedError
+
+    def moves(self):
+        """
+        Return list of moves that apply_move can make on Puzzle self.
+
+        Override this, apply_move and inverse_move in a subclass whose
+        configurations can be changed in place, as ida_star_solve needs.
+
+        @type self: Puzzle
+        @rtype: list
+        """
+        raise NotImplementedError
+
+    def apply_move(self, move):
+        """
+        Change Puzzle self in place by making move.
+
+        @type self: Puzzle
+        @type move: object
+        @rtype: None
+        """
+        raise NotImplementedError
+
+    def inverse_move(self, move):
+        """
+        Return the move that undoes move.
+
+        @type self: Puzzle
+        @type move: object
+        @rtype: object
+        """
+        raise NotImplementedError
+
+    def state_key(self):
+        """
+        Return a compact hashable key for the configuration of Puzzle self.
+
+        Two puzzles working towards the same goal are equal exactly when
+        their keys are equal, so solvers may use keys to detect repeated
+        configurations.  This is an abstract method that must be
+        implemented in a subclass.
+
+        @type self: Puzzle
+        @rtype: tuple | bytes | int | str
+        """
+        raise NotImplementedError
+
+    def __hash__(self):
+        """
+        Return a hash of Puzzle self consistent with its state_key.
+
+        @type self: Puzzle
+        @rtype: int
+        """
+        return hash(self.state_key())
@@ -3,8 +3,17 @@ Some functions for working with puzzles
 """
 from puzzle import Puzzle
 from collections import deque
+from heapq import heappush, heappop
+from copy import copy
+from queue import Empty
+import multiprocessing
+import signal
+import json
+from functools import wraps
+from operator import methodcaller
+from time import perf_counter
 # set higher recursion limit
-# which is needed in PuzzleNode.__str__
+# which is needed in PuzzleNode.__str__ on long solution paths
 # you may uncomment the next lines on a unix system such as CDF
 # import resource
 # resource.setrlimit(resource.RLIMIT_STACK, (2**29, -1))
@@ -12,74 +21,936 @@ import sys
 sys.setrecursionlimit(10**6)
 
 
+class SearchStats:
+    """
+    Counters and timings gathered by a solver given stats=SearchStats().
+
+    When no SearchStats is given the solvers run exactly as before, so
+    gathering statistics costs nothing unless it is asked for.
+
+    === Attributes ===
+    @type generated: int
+        extensions produced
+    @type expanded: int
+        configurations whose extensions were asked for
+    @type duplicates: int
+        extensions skipped because they were already searched
+    @type fail_fast_prunes: int
+        configurations dropped because fail_fast returned True
+    @type peak_frontier: int
+        most configurations waiting to be expanded at once
+    @type peak_searched: int
+        most configurations remembered as searched at once
+    @type max_depth: int
+        most extensions between puzzle and any configuration generated
+    @type hook_time: dict[str, float]
+        seconds spent in each puzzle method, and in "searched" upkeep
+    @type iterations: list[(int, int)]
+        (threshold, nodes) of each ida_star_solve iteration
+    @type elapsed: float
+        seconds for the whole solve
+    """
+
+    def __init__(self):
+        """
+        Create a new SearchStats self with everything at zero.
+
+        @type self: SearchStats
+        @rtype: None
+        """
+        self.generated, self.expanded, self.duplicates = 0, 0, 0
+        self.fail_fast_prunes, self.max_depth = 0, 0
+        self.peak_frontier, self.peak_searched = 0, 0
+        self.hook_time = {"is_solved": 0.0, "fail_fast": 0.0,
+                          "extensions": 0.0, "state_key": 0.0,
+                          "heuristic": 0.0, "searched": 0.0}
+        self.iterations = []
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        """
+        Return the statistics of SearchStats self as a dict.
+
+        @type self: SearchStats
+        @rtype: dict
+        """
+        return {"generated": self.generated, "expanded": self.expanded,
+                "duplicates": self.duplicates,
+                "fail_fast_prunes": self.fail_fast_prunes,
+                "peak_frontier": self.peak_frontier,
+                "peak_searched": self.peak_searched,
+                "max_depth": self.max_depth,
+                "hook_time": dict(self.hook_time),
+                "iterations": [list(i) for i in self.iterations],
+                "elapsed": self.elapsed}
+
+    def to_json(self):
+        """
+        Return the statistics of SearchStats self as a JSON string.
+
+        @type self: SearchStats
+        @rtype: str
+
+        >>> json.loads(SearchStats().to_json())["generated"]
+        0
+        """
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def searched(self, container):
+        """
+        Return a copy of the set or dict container that records
+        duplicates, its size and its upkeep time in SearchStats self.
+
+        @type self: SearchStats
+        @type container: set | dict
+        @rtype: set | dict
+        """
+        if isinstance(container, dict):
+            observed = _ObservedDict(container)
+        else:
+            observed = _ObservedSet(container)
+        observed.stats = self
+        self.peak_searched += len(container)
+        return observed
+
+    def table(self, table):
+        """
+        Return a view of TranspositionTable table that records duplicates,
+        its largest size and its upkeep time in SearchStats self.
+
+        @type self: SearchStats
+        @type table: TranspositionTable
+        @rtype: _ObservedTable
+        """
+        self.peak_searched = max(self.peak_searched, len(table))
+        return _ObservedTable(table, self)
+
+    def frontier(self, container):
+        """
+        Return a copy of the list or deque container that records its
+        largest size in SearchStats self.
+
+        @type self: SearchStats
+        @type container: list | deque
+        @rtype: list | deque
+        """
+        if isinstance(container, deque):
+            observed = _ObservedDeque(container)
+        else:
+            observed = _ObservedList(container)
+        observed.stats = self
+        self.peak_frontier = max(self.peak_frontier, len(container))
+        return observed
+
+    def heappush(self, heap, item):
+        """
+        Push item onto heap, recording the heap's size in SearchStats self.
+
+        @type self: SearchStats
+        @type heap: list
+        @type item: object
+        @rtype: None
+        """
+        heappush(heap, item)
+        if len(heap) > self.peak_frontier:
+            self.peak_frontier = len(heap)
+
+
+class _ObservedSet(set):
+    """
+    A set of searched keys that reports to SearchStats stats.
+    """
+
+    def __contains__(self, key):
+        start = perf_counter()
+        found = set.__contains__(self, key)
+        self.stats.duplicates += found
+        self.stats.hook_time["searched"] += perf_counter() - start
+        return found
+
+    def add(self, key):
+        start = perf_counter()
+        set.add(self, key)
+        self.stats.peak_searched += 1
+        self.stats.hook_time["searched"] += perf_counter() - start
+
+
+class _ObservedDict(dict):
+    """
+    A dict of searched keys that reports to SearchStats stats.
+    """
+
+    def __contains__(self, key):
+        start = perf_counter()
+        found = dict.__contains__(self, key)
+        self.stats.duplicates += found
+        self.stats.hook_time["searched"] += perf_counter() - start
+        return found
+
+    def __setitem__(self, key, value):
+        start = perf_counter()
+        self.stats.peak_searched += not dict.__contains__(self, key)
+        dict.__setitem__(self, key, value)
+        self.stats.hook_time["searched"] += perf_counter() - start
+
+
+class _ObservedTable:
+    """
+    A TranspositionTable of searched keys that reports to SearchStats
+    stats.
+    """
+
+    def __init__(self, table, stats):
+        self.table, self.stats = table, stats
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, key):
+        start = perf_counter()
+        depth = self.table.lookup(key)
+        self.stats.duplicates += depth is not None
+        self.stats.hook_time["searched"] += perf_counter() - start
+        return depth
+
+    def store(self, key, depth):
+        start = perf_counter()
+        self.table.store(key, depth)
+        if len(self.table) > self.stats.peak_searched:
+            self.stats.peak_searched = len(self.table)
+        self.stats.hook_time["searched"] += perf_counter() - start
+
+    def clear(self):
+        self.table.clear()
+
+
+class _ObservedList(list):
+    """
+    A frontier list that reports its largest size to SearchStats stats.
+    """
+
+    def append(self, item):
+        list.append(self, item)
+        if len(self) > self.stats.peak_frontier:
+            self.stats.peak_frontier = len(self)
+
+
+class _ObservedDeque(deque):
+    """
+    A frontier deque that reports its largest size to SearchStats stats.
+    """
+
+    def append(self, item):
+        deque.append(self, item)
+        if len(self) > self.stats.peak_frontier:
+            self.stats.peak_frontier = len(self)
+
+
+class _ObservedPuzzle:
+    """
+    A Puzzle wrapper that counts and times calls to the wrapped puzzle's
+    methods in SearchStats stats, and wraps its extensions in turn.
+    """
+
+    def __init__(self, puzzle, stats, depth):
+        """
+        Wrap puzzle, found depth extensions away from the original puzzle.
+
+        @type self: _ObservedPuzzle
+        @type puzzle: Puzzle
+        @type stats: SearchStats
+        @type depth: int
+        @rtype: None
+        """
+        self.puzzle, self.stats, self.depth = puzzle, stats, depth
+
+    def __getattr__(self, name):
+        return getattr(self.puzzle, name)
+
+    def __copy__(self):
+        return _ObservedPuzzle(copy(self.puzzle), self.stats, self.depth)
+
+    def __eq__(self, other):
+        if isinstance(other, _ObservedPuzzle):
+            other = other.puzzle
+        return self.puzzle == other
+
+    def __hash__(self):
+        return hash(self.puzzle)
+
+    def __str__(self):
+        return str(self.puzzle)
+
+    def __repr__(self):
+        return repr(self.puzzle)
+
+    def _timed(self, hook):
+        start = perf_counter()
+        result = getattr(self.puzzle, hook)()
+        self.stats.hook_time[hook] += perf_counter() - start
+        return result
+
+    def is_solved(self):
+        return self._timed("is_solved")
+
+    def state_key(self):
+        return self._timed("state_key")
+
+    def heuristic(self):
+        return self._timed("heuristic")
+
+    def fail_fast(self):
+        failed = self._timed("fail_fast")
+        self.stats.fail_fast_prunes += bool(failed)
+        return failed
+
+    def goal(self):
+        return _ObservedPuzzle(self.puzzle.goal(), self.stats, 0)
+
+    def extensions(self):
+        stats, depth = self.stats, self.depth + 1
+        stats.expanded += 1
+        start = perf_counter()
+        extensions = iter(self.puzzle.extensions())
+        stats.hook_time["extensions"] += perf_counter() - start
+        while True:
+            start = perf_counter()
+            extension = next(extensions, None)
+            stats.hook_time["extensions"] += perf_counter() - start
+            if extension is None:
+                return
+            stats.generated += 1
+            if depth > stats.max_depth:
+                stats.max_depth = depth
+            yield _ObservedPuzzle(extension, stats, depth)
+
+
+def _observable(solve):
+    """
+    Return solve extended to take stats=SearchStats(), which is filled in
+    by wrapping the puzzle and by solve's own use of stats.
+
+    @type solve: (Puzzle, ...) -> PuzzleNode | None
+    @rtype: (Puzzle, ...) -> PuzzleNode | None
+    """
+    @wraps(solve)
+    def observed_solve(puzzle, *args, stats=None, **kwargs):
+        if stats is None:
+            return solve(puzzle, *args, **kwargs)
+        start = perf_counter()
+        node = solve(_ObservedPuzzle(puzzle, stats, 0), *args, stats=stats,
+                     **kwargs)
+        stats.elapsed += perf_counter() - start
+        root = node
+        while node is not None:
+            node.puzzle = node.puzzle.puzzle
+            node = (node.children or [None])[0]
+        return root
+    return observed_solve
+
+
+# bytes a TranspositionTable entry takes besides its key: a slot in each
+# of its two dicts, measured with tracemalloc and rounded up for resizing
+_ENTRY_BYTES = 128
+
+
+class TranspositionTable:
+    """
+    The configurations a depth-first search has seen, each with the fewest
+    moves it was reached in, kept within a memory budget.
+
+    When the budget is reached an entry is forgotten to make room, so a
+    search that meets that configuration again searches it again instead
+    of running out of memory.  The entry forgotten is the oldest, or with
+    evict="depth" the one reached in the most moves, whose subtree is
+    cheapest to search again.  Depth suits ida_star_solve; the deepest
+    entries of a depth_first_solve are the ones it is about to meet
+    again, so it should forget by age.
+
+    === Attributes ===
+    @type hits: int
+        lookups that found an entry
+    @type misses: int
+        lookups that found none
+    @type evictions: int
+        entries forgotten to stay within budget
+    """
+
+    def __init__(self, budget=64 * 2 ** 20, evict="age"):
+        """
+        Create a new empty TranspositionTable self that holds entries
+        until they take more than budget bytes, then forgets them by
+        evict, "depth" or "age".
+
+        @type self: TranspositionTable
+        @type budget: int
+        @type evict: str
+        @rtype: None
+        """
+        assert evict in ("depth", "age")
+        self._budget, self._evict = budget, evict
+        # moves to each key, oldest first; keys by moves; bytes used; and
+        # the most moves any key may have
+        self._depths, self._levels, self._used, self._deepest = {}, {}, 0, 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def __len__(self):
+        """
+        Return the number of entries in TranspositionTable self.
+
+        @type self: TranspositionTable
+        @rtype: int
+        """
+        return len(self._depths)
+
+    def lookup(self, key):
+        """
+        Return the fewest moves key was stored with, or None if
+        TranspositionTable self has no entry for key.
+
+        @type self: TranspositionTable
+        @type key: object
+        @rtype: int | None
+        """
+        depth = self._depths.get(key)
+        if depth is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return depth
+
+    def store(self, key, depth):
+        """
+        Remember that key was reached in depth moves, unless
+        TranspositionTable self knows a shorter way to it.
+
+        @type self: TranspositionTable
+        @type key: object
+        @type depth: int
+        @rtype: None
+
+        >>> table = TranspositionTable(3 * (_ENTRY_BYTES + 28), "depth")
+        >>> for key, depth in [(1, 0), (2, 5), (3, 1), (4, 2)]:
+        ...     table.store(key, depth)
+        >>> table.lookup(2) is None, table.lookup(4), table.evictions
+        (True, 2, 1)
+        >>> table.hit_rate()
+        0.5
+        """
+        known = self._depths.get(key)
+        if known is not None:
+            if known <= depth:
+                return
+            self._forget(key)
+        size = sys.getsizeof(key) + _ENTRY_BYTES
+        while self._depths and self._used + size > self._budget:
+            if self._evict == "age":
+                self._forget(next(iter(self._depths)))
+            else:
+                while not self._levels.get(self._deepest):
+                    self._deepest -= 1
+                self._forget(next(iter(self._levels[self._deepest])))
+            self.evictions += 1
+        self._depths[key] = depth
+        self._levels.setdefault(depth, {})[key] = None
+        self._deepest = max(self._deepest, depth)
+        self._used += size
+
+    def _forget(self, key):
+        # Remove the entry for key from TranspositionTable self.
+        #
+        # @type self: TranspositionTable
+        # @type key: object
+        # @rtype: None
+        level = self._levels[self._depths.pop(key)]
+        del level[key]
+        self._used -= sys.getsizeof(key) + _ENTRY_BYTES
+
+    def clear(self):
+        """
+        Forget every entry of TranspositionTable self, keeping its
+        counters.
+
+        @type self: TranspositionTable
+        @rtype: None
+        """
+        self._depths, self._levels, self._used, self._deepest = {}, {}, 0, 0
+
+    def hit_rate(self):
+        """
+        Return the fraction of lookups in TranspositionTable self that
+        found an entry.
+
+        @type self: TranspositionTable
+        @rtype: float
+        """
+        return self.hits / max(1, self.hits + self.misses)
+
+    def stats(self):
+        """
+        Return the counters and size of TranspositionTable self.
+
+        @type self: TranspositionTable
+        @rtype: dict
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hit_rate(), "evictions": self.evictions,
+                "entries": len(self._depths), "bytes": self._used}
+
+
 # TODO
 # implement depth_first_solve
 # do NOT change the type contract
 # you are welcome to create any helper functions
 # you like
-def depth_first_solve(puzzle):
+@_observable
+def depth_first_solve(puzzle, stats=None, table=None):
     """
     Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
     a solution, with each child containing an extension of the puzzle
     in its parent.  Return None if this is not possible.
 
+    The search keeps an explicit stack of extension iterators, one per
+    level of the current path, so it never recurses and only holds the
+    unexplored siblings along that path.  Searched configurations are
+    remembered in a set, or in TranspositionTable table if it is given,
+    which may forget some and search them again.
+
     @type puzzle: Puzzle
+    @type stats: SearchStats | None
+    @type table: TranspositionTable | None
     @rtype: PuzzleNode
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"same", "came", "come", "cost", "cast", "case"}
+    >>> stats = SearchStats()
+    >>> path = depth_first_solve(WordLadderPuzzle("same", "cost", ws),
+    ...                          stats=stats)
+    >>> stats.generated >= stats.expanded > 0
+    True
+    >>> path.children[0].parent is path
+    True
+    >>> while path.children:
+    ...     path = path.children[0]
+    >>> path.puzzle.is_solved()
+    True
+    >>> depth_first_solve(WordLadderPuzzle("same", "zzzz", ws)) is None
+    True
+    >>> table = TranspositionTable(budget=0)
+    >>> depth_first_solve(WordLadderPuzzle("same", "cost", ws),
+    ...                   table=table) is not None
+    True
+    >>> len(table), table.evictions > 0
+    (1, True)
+    >>> stats = SearchStats()
+    >>> path = depth_first_solve(WordLadderPuzzle("same", "cost", ws),
+    ...                          stats=stats, table=TranspositionTable())
+    >>> stats.peak_searched > 0
+    True
     """
-    tree = PuzzleNode()
-    tree.puzzle = puzzle
     searched = set()
+    # path[i] is the puzzle whose extensions are being walked by stack[i + 1]
+    path, stack = [], [iter([puzzle])]
+    if stats is not None:
+        searched, stack = stats.searched(searched), stats.frontier(stack)
+        if table is not None:
+            table = stats.table(table)
+    # keys of path, kept in a set when table may have forgotten some of
+    # them, so the search never walks round a cycle
+    on_path, path_keys = set(), []
 
-    def find(node,searched):
-        """
+    while stack:
+        extension = next(stack[-1], None)
+        if extension is None:
+            #  Every extension at this level failed, so back up one level.
+            stack.pop()
+            if path:
+                path.pop()
+                if table is not None:
+                    on_path.discard(path_keys.pop())
+            continue
 
-        @type node: PuzzleNode
-        @type searched: Set
-        @return:
-        """
+        if extension.is_solved():
+            path.append(extension)
+            return _build_path(path)
 
-        found = None
-        extensions = node.puzzle.extensions()
-        temp_child = PuzzleNode()
-        children = []
+        key = extension.state_key()
+        if table is None:
+            if key in searched:
+                continue
+            searched.add(key)
+        else:
+            if table.lookup(key) is not None or key in on_path:
+                continue
+            table.store(key, len(path))
+        #  Trap for configurations that have already been searched.
 
-        if node.puzzle.is_solved():
-            return node
+        if extension.fail_fast():
+            continue
+        #  Trap for known incorrect configurations
 
-        #  Check if the current puzzle is solved
+        path.append(extension)
+        if table is not None:
+            on_path.add(key)
+            path_keys.append(key)
+        stack.append(iter(extension.extensions()))
+    return None
 
-        if node == None or node.puzzle.__repr__() in searched:
-            return None
-        searched.add(node.puzzle.__repr__())
-        #  Trap for configurations that have already been searched.
 
-        if node.puzzle.fail_fast():
-            return None
-        #  Trap for known incorrect configurations
+def parallel_depth_first_solve(puzzle, workers=None):
+    """
+    Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+    a solution, with each child containing an extension of the puzzle
+    in its parent.  Return None if this is not possible.
 
-        for extension in extensions:
-            if extension.__repr__().strip() not in searched:
-                #temp_child.puzzle = extension
-                #temp_child.parent = node
-                node.children.append(PuzzleNode(extension,None,node))
-        x = 0
-        while found == None and x < len(node.children):
-            found = find(node.children[x],searched)
-            x += 1
+    The top levels are expanded breadth-first until there are a few
+    subtrees per worker process, and the subtrees are searched
+    depth-first in parallel.  A worker that sees another waiting for
+    work hands it the untried extensions nearest the top of its own
+    search.  Each worker is sent puzzle once; tasks and results are the
+    state keys on the path from puzzle, which the receiver follows
+    through extensions again, and everything stops as soon as one worker
+    finds a solution.
 
-        #  check extensions for solutions one by one
+    @type puzzle: Puzzle
+    @type workers: int | None
+    @rtype: PuzzleNode
 
-        #if found != None:
-        #    pass
-            #  used for debugging purposes
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"same", "came", "come", "cost", "cast", "case", "cose"}
+    >>> path = parallel_depth_first_solve(WordLadderPuzzle("same", "cost", ws),
+    ...                                   workers=2)
+    >>> while path.children:
+    ...     path = path.children[0]
+    >>> path.puzzle.is_solved()
+    True
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if puzzle.is_solved():
+        return PuzzleNode(puzzle)
+    if puzzle.fail_fast():
+        return None
+
+    #  Split the search into subtrees with a few breadth-first layers.
+    searched = {puzzle.state_key()}
+    layer = [(puzzle, None)]
+    while layer and len(layer) < 4 * workers:
+        next_layer = []
+        for record in layer:
+            if record[0].fail_fast():
+                continue
+            for extension in record[0].extensions():
+                key = extension.state_key()
+                if key in searched:
+                    continue
+                searched.add(key)
+                if extension.is_solved():
+                    return _build_path(_record_path((extension, record)))
+                next_layer.append((extension, record))
+        layer = next_layer
+    if not layer:
+        return None
+
+    tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+    # workers waiting for a task, and tasks queued or being searched
+    hungry = multiprocessing.Value("i", 0)
+    pending = multiprocessing.Value("i", len(layer))
+    done = multiprocessing.Event()
+    for record in layer:
+        tasks.put([step.state_key() for step in _record_path(record)[1:]])
+    processes = [multiprocessing.Process(
+        target=_parallel_worker,
+        args=(puzzle, tasks, results, hungry, pending, done),
+        daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        while True:
+            try:
+                return _build_path(_follow(puzzle,
+                                           results.get(timeout=0.05)))
+            except Empty:
+                #  A worker with a solution never marks its task finished.
+                if pending.value == 0:
+                    return None
+    finally:
+        done.set()
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+        tasks.cancel_join_thread()
+        tasks.close()
+        results.close()
+
+
+def _follow(puzzle, keys):
+    """
+    Return the puzzles from puzzle through the extensions whose state
+    keys are keys, in order.
+
+    @type puzzle: Puzzle
+    @type keys: list
+    @rtype: list[Puzzle]
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"same", "came", "come", "cost"}
+    >>> _follow(WordLadderPuzzle("same", "cost", ws), ["came", "come"])
+    [same, came, come]
+    """
+    puzzles = [puzzle]
+    for key in keys:
+        puzzles.append(next(extension
+                            for extension in puzzles[-1].extensions()
+                            if extension.state_key() == key))
+    return puzzles
+
+
+def _parallel_worker(puzzle, tasks, results, hungry, pending, done):
+    """
+    Search tasks, each the state keys on a path from puzzle to a subtree,
+    depth-first until one of them gives a solution, which is put on
+    results as the state keys on its path from puzzle, or done is set.
+
+    @type puzzle: Puzzle
+    @type tasks: multiprocessing.Queue
+    @type results: multiprocessing.Queue
+    @type hungry: multiprocessing.Value
+    @type pending: multiprocessing.Value
+    @type done: multiprocessing.Event
+    @rtype: None
+    """
+    # donated tasks may never be taken, so don't wait to flush them on exit
+    tasks.cancel_join_thread()
+    searched = set()
+    while not done.is_set():
+        with hungry.get_lock():
+            hungry.value += 1
+        try:
+            keys = tasks.get(timeout=0.05)
+        except Empty:
+            continue
+        finally:
+            with hungry.get_lock():
+                hungry.value -= 1
+
+        prefix = keys[:-1]
+        path = _shared_depth_first_solve(_follow(puzzle, keys)[-1], searched,
+                                         prefix, tasks, hungry, pending, done)
+        if path is not None:
+            results.put(prefix + path)
+            return
+        with pending.get_lock():
+            pending.value -= 1
+
+
+def _shared_depth_first_solve(puzzle, searched, prefix, tasks, hungry,
+                              pending, done):
+    """
+    Return the state keys of the puzzles on a path from puzzle to a
+    solution, or None if there is none or done is set.
+
+    This is depth_first_solve, except that every so often it gives up
+    the untried extensions nearest puzzle as new tasks if another worker
+    is hungry.  prefix is the state keys on the path from the original
+    puzzle to puzzle's parent.
+
+    @type puzzle: Puzzle
+    @type searched: set
+    @type prefix: list
+    @type tasks: multiprocessing.Queue
+    @type hungry: multiprocessing.Value
+    @type pending: multiprocessing.Value
+    @type done: multiprocessing.Event
+    @rtype: list | None
+    """
+    # state keys of the puzzles on the path being searched
+    path, stack = [], [iter([puzzle])]
+    steps = 0
+    while stack:
+        steps += 1
+        if steps % 256 == 0:
+            if done.is_set():
+                return None
+            if hungry.value > 0:
+                #  Give away the shallowest level that has extensions left.
+                for level in range(1, len(stack)):
+                    donated = list(stack[level])
+                    if donated:
+                        stack[level] = iter([])
+                        with pending.get_lock():
+                            pending.value += len(donated)
+                        for extension in donated:
+                            tasks.put(prefix + path[:level] +
+                                      [extension.state_key()])
+                        break
+
+        extension = next(stack[-1], None)
+        if extension is None:
+            stack.pop()
+            if path:
+                path.pop()
+            continue
+
+        key = extension.state_key()
+        if extension.is_solved():
+            path.append(key)
+            return path
+
+        if key in searched:
+            continue
+        searched.add(key)
+
+        if extension.fail_fast():
+            continue
+
+        path.append(key)
+        stack.append(iter(extension.extensions()))
+    return None
+
+
+def solve_many(puzzles, method=depth_first_solve, workers=None, chunksize=1,
+               timeout=None, initializer=None, initargs=()):
+    """
+    Solve each of puzzles with method in a pool of worker processes,
+    yielding (index, solution, status) as each one finishes, in any
+    order.
+
+    index is the position of the puzzle in puzzles, solution is what
+    method returned, and status is "solved", "unsolvable" or, when the
+    puzzle took longer than timeout seconds, "timeout".  initializer is
+    called with initargs once in each worker, e.g. load_word_set with
+    the name of a word file so each worker reads the words once.
+
+    Every worker is sent puzzles and method once, when it starts, so
+    what the puzzles share, such as a word set, is sent once per worker.
+    Jobs are then just indexes, and solutions come back as the state
+    keys on their paths, which are followed through extensions again.
+
+    @type puzzles: iterable[Puzzle]
+    @type method: (Puzzle) -> PuzzleNode | None
+    @type workers: int | None
+    @type chunksize: int
+    @type timeout: float | None
+    @type initializer: (...) -> None | None
+    @type initargs: tuple
+    @rtype: generator[(int, PuzzleNode | None, str)]
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle, load_word_set
+    >>> ws = load_word_set("wordstest.txt")
+    >>> ladders = [WordLadderPuzzle("same", "cost", ws),
+    ...            WordLadderPuzzle("same", "zzzz", ws)]
+    >>> sorted([(i, status) for i, _, status in solve_many(
+    ...     ladders, breadth_first_solve, workers=2,
+    ...     initializer=load_word_set, initargs=("wordstest.txt",))])
+    [(0, 'solved'), (1, 'unsolvable')]
+    """
+    puzzles = list(puzzles)
+    pool = multiprocessing.Pool(workers, _start_solve_many,
+                                (puzzles, method, timeout, initializer,
+                                 initargs))
+    try:
+        for i, keys, status in pool.imap_unordered(
+                _solve_one, range(len(puzzles)), chunksize):
+            yield i, (_build_path(_follow(puzzles[i], keys))
+                      if keys is not None else None), status
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class _SolveTimeout(Exception):
+    """
+    Raised in a solve_many worker when a puzzle runs out of time.
+    """
+
+
+def _raise_solve_timeout(signum, frame):
+    """
+    Signal handler that interrupts the current solve_many puzzle.
+
+    @type signum: int
+    @rtype: None
+    """
+    raise _SolveTimeout
+
+
+# (puzzles, method, timeout) of the solve_many call this worker serves
+_solve_many_job = None
+
+
+def _start_solve_many(puzzles, method, timeout, initializer, initargs):
+    """
+    Keep the puzzles, method and timeout of a solve_many call in this
+    worker, after calling initializer with initargs if it is not None.
+
+    @type puzzles: list[Puzzle]
+    @type method: (Puzzle) -> PuzzleNode | None
+    @type timeout: float | None
+    @type initializer: (...) -> None | None
+    @type initargs: tuple
+    @rtype: None
+    """
+    global _solve_many_job
+    if initializer is not None:
+        initializer(*initargs)
+    _solve_many_job = puzzles, method, timeout
+
+
+def _solve_one(i):
+    """
+    Return (i, keys, status) for puzzle i of solve_many, where keys are
+    the state keys of the configurations after it on the solution path,
+    or None.
+
+    @type i: int
+    @rtype: (int, list | None, str)
+    """
+    puzzles, method, timeout = _solve_many_job
+    puzzle = puzzles[i]
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, _raise_solve_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        try:
+            node = method(puzzle)
+        finally:
+            #  Still guarded: the alarm may go off before it is cleared.
+            if timeout is not None:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except _SolveTimeout:
+        return i, None, "timeout"
+    if node is None:
+        return i, None, "unsolvable"
+    #  Send state keys back, since deep PuzzleNode chains pickle badly
+    #  and puzzles may carry what they share.
+    keys = []
+    while node.children:
+        node = node.children[0]
+        keys.append(node.puzzle.state_key())
+    return i, keys, "solved"
+
+
+def _build_path(puzzles):
+    """
+    Return the root of a chain of PuzzleNodes holding puzzles in order,
+    with each PuzzleNode having its successor as its only child.
+
+    @type puzzles: list[Puzzle]
+    @rtype: PuzzleNode
+    """
+    node = None
+    for puzzle in reversed(puzzles):
+        parent = PuzzleNode(puzzle)
+        if node is not None:
+            parent.children.append(node)
+            node.parent = parent
+        node = parent
+    return node
 
-        if found == None:
-            node.children = None
-            return None
-        node.children = [found]
-        return node
 
-    return find(tree,searched)
 # TODO
 # implement breadth_first_solve
 # do NOT change the type contract
@@ -87,69 +958,469 @@ def depth_first_solve(puzzle):
 # you like
 # Hint: you may find a queue useful, that's why
 # we imported deque
-def breadth_first_solve(puzzle):
+@_observable
+def breadth_first_solve(puzzle, stats=None):
     """
     Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
     a solution, with each child PuzzleNode containing an extension
     of the puzzle in its parent.  Return None if this is not possible.
 
+    Configurations are marked as searched when they are queued, and each
+    queued configuration is kept as a single (puzzle, parent) record; the
+    PuzzleNode path is only built for the solution.
+
     @type puzzle: Puzzle
+    @type stats: SearchStats | None
     @rtype: PuzzleNode
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"same", "came", "come", "cost", "cast", "case", "cose"}
+    >>> path = breadth_first_solve(WordLadderPuzzle("same", "cost", ws))
+    >>> words = []
+    >>> while path:
+    ...     words.append(path.puzzle.__repr__())
+    ...     path = (path.children or [None])[0]
+    >>> len(words), words[0], words[-1]
+    (5, 'same', 'cost')
+    >>> breadth_first_solve(WordLadderPuzzle("same", "zzzz", ws)) is None
+    True
     """
-    tree = PuzzleNode()
-    tree.puzzle = puzzle
-    searched = set()
-    queue = deque()
+    if puzzle.is_solved():
+        return PuzzleNode(puzzle)
 
-    if tree.puzzle.is_solved():
-        return tree
+    searched = {puzzle.state_key()}
+    queue = deque([(puzzle, None)])
+    if stats is not None:
+        searched, queue = stats.searched(searched), stats.frontier(queue)
 
-    def find(node,searched,queue):
-        """
+    while queue:
+        record = queue.popleft()
+        node_puzzle = record[0]
 
-        @type node: PuzzleNode
-        @type searched: Set
-        @return:
-        """
+        if node_puzzle.fail_fast():
+            continue
+        #  Trap for known incorrect configurations
 
-        found = None
-        extensions = node.puzzle.extensions()
-        children = []
+        for extension in node_puzzle.extensions():
+            key = extension.state_key()
+            if key in searched:
+                continue
+            searched.add(key)
 
-        if node.puzzle.fail_fast():
-            return None
-        #  Trap for known incorrect configurations
+            if extension.is_solved():
+                return _build_path(_record_path((extension, record)))
+            #  Check the children for a solution, add to a queue if there isn't
+            queue.append((extension, record))
+    return None
+
+
+def _record_path(record):
+    """
+    Return the puzzles from the root record to record, following the
+    parent links of (puzzle, parent) records.
+
+    @type record: tuple
+    @rtype: list[Puzzle]
+    """
+    puzzles = []
+    while record is not None:
+        puzzles.append(record[0])
+        record = record[1]
+    puzzles.reverse()
+    return puzzles
 
-        if extensions == []:
+
+@_observable
+def bidirectional_solve(puzzle, stats=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, with each child PuzzleNode containing an
+    extension of the puzzle in its parent.  Return None if this is not
+    possible.
+
+    Breadth-first searches grow from puzzle and from puzzle.goal() a
+    layer at a time, always growing the smaller frontier, until a
+    configuration is reached from both sides.  Puzzles that are not
+    reversible are solved with breadth_first_solve instead.
+
+    @type puzzle: Puzzle
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"same", "came", "come", "cost", "cast", "case", "cose"}
+    >>> path = bidirectional_solve(WordLadderPuzzle("same", "cost", ws))
+    >>> words = []
+    >>> while path:
+    ...     words.append(path.puzzle.__repr__())
+    ...     path = (path.children or [None])[0]
+    >>> len(words), words[0], words[-1]
+    (5, 'same', 'cost')
+    >>> bidirectional_solve(WordLadderPuzzle("same", "zzzz", ws)) is None
+    True
+    """
+    if not puzzle.is_reversible():
+        return breadth_first_solve.__wrapped__(puzzle, stats)
+    if puzzle.is_solved():
+        return PuzzleNode(puzzle)
+
+    # records are (puzzle, parent, depth); parents lead back to puzzle on
+    # the forward side and to the goal on the backward side
+    goal = puzzle.goal()
+    forward = (puzzle, None, 0)
+    backward = (goal, None, 0)
+    forward_searched = {puzzle.state_key(): forward}
+    backward_searched = {goal.state_key(): backward}
+    forward_layer, backward_layer = [forward], [backward]
+    if stats is not None:
+        forward_searched = stats.searched(forward_searched)
+        backward_searched = stats.searched(backward_searched)
+
+    while forward_layer and backward_layer:
+        is_forward = len(forward_layer) <= len(backward_layer)
+        if is_forward:
+            layer, searched, other = (forward_layer, forward_searched,
+                                      backward_searched)
+        else:
+            layer, searched, other = (backward_layer, backward_searched,
+                                      forward_searched)
+
+        #  Finish the whole layer, keeping the shortest meeting found.
+        meeting, next_layer = None, []
+        if stats is not None:
+            next_layer = stats.frontier(next_layer)
+        for record in layer:
+            if record[0].fail_fast():
+                continue
+            for extension in record[0].extensions():
+                key = extension.state_key()
+                if key in searched:
+                    continue
+                searched[key] = child = (extension, record, record[2] + 1)
+                next_layer.append(child)
+                met = other.get(key)
+                if met is not None and (meeting is None or
+                                        child[2] + met[2] <
+                                        meeting[0][2] + meeting[1][2]):
+                    meeting = (child, met)
+
+        if meeting is not None:
+            if not is_forward:
+                meeting = (meeting[1], meeting[0])
+            puzzles = _record_path(meeting[0])
+            record = meeting[1][1]
+            while record is not None:
+                puzzles.append(record[0])
+                record = record[1]
+            return _build_path(puzzles)
+
+        if is_forward:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+    return None
+
+
+def all_shortest_solve(puzzle, k=None):
+    """
+    Yield every shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, with each child PuzzleNode containing an
+    extension of the puzzle in its parent, stopping after k paths if k
+    is not None.
+
+    One breadth-first search keeps, for each configuration, all the
+    configurations in the layer before it that extend to it.  The paths
+    are then read off those links one at a time, so memory grows with
+    the configurations searched, not with the number of paths.
+
+    @type puzzle: Puzzle
+    @type k: int | None
+    @rtype: generator[PuzzleNode]
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"same", "came", "come", "cost", "cast", "case", "cose"}
+    >>> ladders = []
+    >>> for path in all_shortest_solve(WordLadderPuzzle("same", "cost", ws)):
+    ...     words = [path.puzzle.__repr__()]
+    ...     while path.children:
+    ...         path = path.children[0]
+    ...         words.append(path.puzzle.__repr__())
+    ...     ladders.append(" ".join(words))
+    >>> sorted(ladders)
+    ['same came case cast cost', 'same came case cose cost', 'same came come cose cost']
+    >>> len(list(all_shortest_solve(WordLadderPuzzle("same", "cost", ws), 1)))
+    1
+    >>> list(all_shortest_solve(WordLadderPuzzle("same", "cost", ws), 0))
+    []
+    >>> list(all_shortest_solve(WordLadderPuzzle("cost", "cost", ws), 0))
+    []
+    """
+    if k is not None and k <= 0:
+        return
+    if puzzle.is_solved():
+        yield PuzzleNode(puzzle)
+        return
+    if puzzle.fail_fast():
+        return
+
+    # (configuration, layer, keys of its parents in the layer before) by key
+    key = puzzle.state_key()
+    nodes = {key: (puzzle, 0, [])}
+    layer, depth, solutions = [key], 0, []
+    while layer and not solutions:
+        next_layer, depth = [], depth + 1
+        for key in layer:
+            if nodes[key][0].fail_fast():
+                continue
+            for extension in nodes[key][0].extensions():
+                extension_key = extension.state_key()
+                node = nodes.get(extension_key)
+                if node is None:
+                    nodes[extension_key] = (extension, depth, [key])
+                    next_layer.append(extension_key)
+                    if extension.is_solved():
+                        solutions.append(extension_key)
+                elif node[1] == depth:
+                    node[2].append(key)
+        layer = next_layer
+
+    count = 0
+    for solution in solutions:
+        #  Walk back to puzzle through every choice of parent.
+        path, stack = [solution], [iter(nodes[solution][2])]
+        while stack:
+            parent = next(stack[-1], None)
+            if parent is None:
+                stack.pop()
+                path.pop()
+                continue
+            path.append(parent)
+            if nodes[parent][2]:
+                stack.append(iter(nodes[parent][2]))
+                continue
+            yield _build_path([nodes[key][0] for key in reversed(path)])
+            count += 1
+            if count == k:
+                return
+            path.pop()
+
+
+@_observable
+def astar_solve(puzzle, heuristic=None, stats=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, with each child PuzzleNode containing an
+    extension of the puzzle in its parent.  Return None if this is not
+    possible.
+
+    Configurations are expanded in order of extensions so far plus
+    heuristic(configuration), which defaults to the puzzle's own
+    heuristic().  The path is shortest whenever heuristic never
+    overestimates.  Outdated entries in the open list are skipped when
+    popped instead of being removed.
+
+    @type puzzle: Puzzle
+    @type heuristic: (Puzzle) -> int | None
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode
+
+    >>> from mn_puzzle import MNPuzzle
+    >>> target = (("1", "2", "3"), ("4", "5", "*"))
+    >>> path = astar_solve(MNPuzzle((("*", "2", "3"), ("1", "4", "5")), target))
+    >>> steps = 0
+    >>> while path.children:
+    ...     path, steps = path.children[0], steps + 1
+    >>> steps, path.puzzle.is_solved()
+    (3, True)
+    >>> stats = SearchStats()
+    >>> path = astar_solve(MNPuzzle((("*", "2", "3"), ("1", "4", "5")), target),
+    ...                    stats=stats)
+    >>> stats.generated >= stats.expanded > 0, stats.max_depth >= 3
+    (True, True)
+    >>> stats.hook_time["heuristic"] > 0, type(path.puzzle).__name__
+    (True, 'MNPuzzle')
+    """
+    if heuristic is None:
+        heuristic = methodcaller("heuristic")
+
+    # entries are (f, -g, tie, key, record): ties go to the deeper entry,
+    # then to the older one, so records are never compared
+    key = puzzle.state_key()
+    best = {key: 0}
+    heap = [(heuristic(puzzle), 0, 0, key, (puzzle, None))]
+    tie = 1
+    push = heappush
+    if stats is not None:
+        best, push = stats.searched(best), stats.heappush
+
+    while heap:
+        f, g, _, key, record = heappop(heap)
+        g = -g
+        if g > best[key]:
+            continue
+        #  A shorter way to this configuration was found after this push.
+
+        node_puzzle = record[0]
+        if node_puzzle.is_solved():
+            return _build_path(_record_path(record))
+        if node_puzzle.fail_fast():
+            continue
+
+        for extension in node_puzzle.extensions():
+            extension_key = extension.state_key()
+            if extension_key in best and best[extension_key] <= g + 1:
+                continue
+            best[extension_key] = g + 1
+            push(heap, (g + 1 + heuristic(extension), -g - 1, tie,
+                        extension_key, (extension, record)))
+            tie += 1
+    return None
+
+
+@_observable
+def ida_star_solve(puzzle, heuristic=None, report=None, stats=None,
+                   table=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, with each child PuzzleNode containing an
+    extension of the puzzle in its parent.  Return None if this is not
+    possible.
+
+    Iterative-deepening A*: each iteration is a depth-first search that
+    skips configurations whose moves so far plus heuristic exceeds the
+    threshold, which then rises to the smallest value that was skipped.
+    Moves are made and undone in place on a copy of puzzle, which must
+    implement moves, apply_move and inverse_move, so memory is linear in
+    the solution length.  A move that undoes the one before it is never
+    tried.  report(threshold, nodes) is called after each iteration.
+
+    If TranspositionTable table is given, a configuration already reached
+    in as few moves during the same iteration is not searched again.
+
+    @type puzzle: Puzzle
+    @type heuristic: (Puzzle) -> int | None
+    @type report: (int, int) -> None | None
+    @type stats: SearchStats | None
+    @type table: TranspositionTable | None
+    @rtype: PuzzleNode
+
+    >>> from mn_puzzle import MNPuzzle
+    >>> target = (("1", "2", "3"), ("4", "5", "*"))
+    >>> start = MNPuzzle((("*", "2", "3"), ("1", "4", "5")), target)
+    >>> path = ida_star_solve(start)
+    >>> path.puzzle == start
+    True
+    >>> steps = 0
+    >>> while path.children:
+    ...     path, steps = path.children[0], steps + 1
+    >>> steps, path.puzzle.is_solved()
+    (3, True)
+    >>> table = TranspositionTable()
+    >>> ida_star_solve(start, table=table).puzzle == start
+    True
+    >>> table.misses > 0
+    True
+    """
+    if heuristic is None:
+        heuristic = methodcaller("heuristic")
+    if puzzle.fail_fast():
+        return None
+
+    if stats is not None and table is not None:
+        table = stats.table(table)
+    work = copy(puzzle)
+    threshold = heuristic(work)
+    while True:
+        if table is not None:
+            table.clear()
+        moves, nodes, threshold_next = _ida_star_iteration(work, heuristic,
+                                                           threshold, table)
+        if report is not None:
+            report(threshold, nodes)
+        if stats is not None:
+            stats.generated += nodes
+            stats.iterations.append((threshold, nodes))
+        if moves is not None:
+            #  Replay the moves on fresh copies to build the path.
+            work, puzzles = copy(puzzle), [puzzle]
+            for move in moves:
+                work.apply_move(move)
+                puzzles.append(copy(work))
+            return _build_path(puzzles)
+        if threshold_next is None:
             return None
-            #  Return None for nodes with no children
+        threshold = threshold_next
 
-        for extension in extensions:
-            if extension.__repr__().strip() not in searched:
-                if extension.is_solved():
-                    return PuzzleNode(extension,None,node)
 
-                #  Check the children for a solution, add to a queue if there isn't
-                node.children.append(PuzzleNode(extension,None,node))
-                queue.appendleft(PuzzleNode(extension,None,node))
+def _ida_star_iteration(work, heuristic, threshold, table=None):
+    """
+    Return (moves, nodes, threshold_next) for one depth-first pass from
+    work bounded by threshold, skipping configurations TranspositionTable
+    table has seen in as few moves.
+
+    moves leads from work to a solution, or is None if there is none
+    within threshold; nodes counts configurations visited;
+    threshold_next is the smallest bound that was exceeded, or None if
+    nothing was cut off.  work is back in its original configuration
+    when this returns.
+
+    @type work: Puzzle
+    @type heuristic: (Puzzle) -> int
+    @type threshold: int
+    @type table: TranspositionTable | None
+    @rtype: (list | None, int, int | None)
+    """
+    nodes, threshold_next = 1, None
+    estimate = heuristic(work)
+    if estimate > threshold:
+        return None, nodes, estimate
+    if work.is_solved():
+        return [], nodes, None
+    if table is not None:
+        table.store(work.state_key(), 0)
 
+    # moves[i] was made to reach the configuration stack[i + 1] walks;
+    # undo[i] is its inverse, which is never tried right after it
+    moves, undo, stack = [], [], [iter(work.moves())]
+    while stack:
+        move = next(stack[-1], None)
+        if move is None:
+            stack.pop()
+            if moves:
+                moves.pop()
+                work.apply_move(undo.pop())
+            continue
+        if undo and move == undo[-1]:
+            continue
 
-        if list(queue) != []:
-            return find(queue.pop(),searched,queue)
-        #  check extensions for solutions one by one
+        work.apply_move(move)
+        nodes += 1
+        estimate = len(moves) + 1 + heuristic(work)
+        if estimate > threshold:
+            if threshold_next is None or estimate < threshold_next:
+                threshold_next = estimate
+            work.apply_move(work.inverse_move(move))
+            continue
+        if table is not None:
+            #  Reached before in as few moves, with as much to spare.
+            key = work.state_key()
+            known = table.lookup(key)
+            if known is not None and known <= len(moves) + 1:
+                work.apply_move(work.inverse_move(move))
+                continue
+            table.store(key, len(moves) + 1)
 
+        moves.append(move)
+        undo.append(work.inverse_move(move))
+        if work.is_solved():
+            solution = moves[:]
+            while undo:
+                work.apply_move(undo.pop())
+            return solution, nodes, None
+        stack.append(iter(work.moves()))
+    return None, nodes, threshold_next
 
-        if found != None:
-            pass
-            #  used for debugging purposes
 
-        return node
-    solution = find(tree,searched,queue)
-    while solution.parent != None:
-        solution.parent.children = [solution]
-        solution = solution.parent
-    #  Format the node such that each parent has only one child.
-    return solution
 # Class PuzzleNode helps build trees of PuzzleNodes that have
 # an arbitrary number of children, and a parent.
 class PuzzleNode:
@@ -157,6 +1428,7 @@ class PuzzleNode:
     A Puzzle configuration that refers to other configurations that it
     can be extended to.
     """
+    __slots__ = ("puzzle", "children", "parent")
 
     def __init__(self, puzzle=None, children=None, parent=None):
         """
@@ -1,10 +1,99 @@
 from puzzle import Puzzle
+from array import array
+
+# _SudokuLayouts already built, by (n, symbol set)
+_layouts = {}
+
+
+class _SudokuLayout:
+    """
+    What every nxn SudokuPuzzle with the same symbol set shares: the
+    number and bit of each symbol, and the row, column and subsquare of
+    each position.
+    """
+    __slots__ = ("n", "symbol_set", "symbols", "numbers", "full", "units",
+                 "unit_positions", "position_units", "peers", "span")
+
+    def __init__(self, n, symbol_set):
+        """
+        Create a new _SudokuLayout self for nxn puzzles with symbol_set.
+
+        @type self: _SudokuLayout
+        @type n: int
+        @type symbol_set: frozenset[str]
+        @rtype: None
+        """
+        self.n, self.symbol_set = n, symbol_set
+        # symbol number k + 1 at a position stands for symbols[k], whose
+        # bit is 1 << k; 0 stands for "*"
+        self.symbols = ["*"] + sorted(symbol_set)
+        self.numbers = {symbol: k for k, symbol in enumerate(self.symbols)}
+        self.full = (1 << n) - 1
+        # (row, column, subsquare) of each position
+        ss = round(n ** (1 / 2))
+        self.units = [(m // n, m % n, (m // n) // ss * ss + (m % n) // ss)
+                      for m in range(n ** 2)]
+        # positions of each row, then each column, then each subsquare
+        self.unit_positions = [[m for m in range(n ** 2)
+                                if self.units[m][kind] == u]
+                               for kind in range(3) for u in range(n)]
+        # the units of each position, numbered as in unit_positions
+        self.position_units = [(row, n + column, 2 * n + subsquare)
+                               for row, column, subsquare in self.units]
+        # other positions sharing a row, column or subsquare with each
+        self.peers = [[p for p in range(n ** 2) if p != m and any(
+            [a == b for a, b in zip(self.units[m], self.units[p])])]
+            for m in range(n ** 2)]
+        # one more than the most peers a position has
+        self.span = 3 * n - 2 * ss
+
+    def __reduce__(self):
+        """
+        Pickle _SudokuLayout self as its key, so the process that
+        unpickles it shares its own copy.
+
+        @type self: _SudokuLayout
+        @rtype: tuple
+        """
+        return _layout, (self.n, self.symbol_set)
+
+
+def _layout(n, symbol_set):
+    # Return the shared _SudokuLayout for n and symbol_set.
+    #
+    # @type n: int
+    # @type symbol_set: frozenset[str]
+    # @rtype: _SudokuLayout
+    layout = _layouts.get((n, symbol_set))
+    if layout is None:
+        layout = _layouts[(n, symbol_set)] = _SudokuLayout(n, symbol_set)
+    return layout
+
+
+# order of a position that already has a symbol
+_FILLED = 0xFFFF
+
+
+def _count(mask):
+    # Return the number of bits set in mask.
+    #
+    # @type mask: int
+    # @rtype: int
+    return bin(mask).count("1")
 
 
 class SudokuPuzzle(Puzzle):
     """
     A sudoku puzzle that may be solved, unsolved, or even unsolvable.
+
+    The symbols are kept as one byte per position, with a bitmask of the
+    symbols already used in each row, column and subsquare, so the
+    symbols allowed at a position are a few bitwise operations away.
+    Each empty position also has an order, kept up to date as symbols
+    are placed, so extensions can branch on the most constrained one.
     """
+    __slots__ = ("_layout", "_cells", "_rows", "_columns", "_subsquares",
+                 "_order", "_excluded", "_reduced")
 
     def __init__(self, n, symbols, symbol_set):
         """
@@ -21,7 +110,28 @@ class SudokuPuzzle(Puzzle):
         assert all([d in (symbol_set | {"*"}) for d in symbols])
         assert len(symbol_set) == n
         assert len(symbols) == n ** 2
-        self._n, self._symbols, self._symbol_set = n, symbols, symbol_set
+        self._layout = layout = _layout(n, frozenset(symbol_set))
+        self._cells = bytearray([layout.numbers[d] for d in symbols])
+        self._rows, self._columns = [0] * n, [0] * n
+        self._subsquares = [0] * n
+        for m, number in enumerate(self._cells):
+            if number:
+                row, column, subsquare = layout.units[m]
+                self._rows[row] |= 1 << (number - 1)
+                self._columns[column] |= 1 << (number - 1)
+                self._subsquares[subsquare] |= 1 << (number - 1)
+        # symbols ruled out at positions by fail_fast, and whether every
+        # forced symbol has been filled in
+        self._excluded, self._reduced = {}, False
+        # count * span + span - 1 - empty peers of each empty position,
+        # smallest for the fewest allowed symbols then the most empty
+        # peers, and _FILLED for the rest
+        self._order = array("H", [_FILLED]) * (n ** 2)
+        for m, number in enumerate(self._cells):
+            if not number:
+                empty = len([p for p in layout.peers[m] if not self._cells[p]])
+                self._order[m] = (_count(self._allowed(m)) * layout.span +
+                                  layout.span - 1 - empty)
 
     def __eq__(self, other):
         """
@@ -52,12 +162,43 @@ class SudokuPuzzle(Puzzle):
         False
         """
         return (type(other) == type(self) and
-                self._n == other._n and self._symbols == other._symbols and
-                self._symbol_set == other._symbol_set)
+                self._layout is other._layout and
+                self._cells == other._cells)
+
+    def __hash__(self):
+        """
+        Return a hash of SudokuPuzzle self consistent with __eq__.
+
+        @type self: SudokuPuzzle
+        @rtype: int
+        """
+        return hash(self.state_key())
+
+    def state_key(self):
+        """
+        Return the symbol numbers of SudokuPuzzle self as bytes, 0 for
+        "*".
+
+        @type self: SudokuPuzzle
+        @rtype: bytes
+
+        >>> s = SudokuPuzzle(1, ["*"], {"A"})
+        >>> s.state_key()
+        b'\\x00'
+        """
+        return bytes(self._cells)
+
+    def _symbols(self):
+        # Return the symbols of SudokuPuzzle self, "*" for empty positions.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: list[str]
+        symbols = self._layout.symbols
+        return [symbols[number] for number in self._cells]
 
     def __repr__(self):
         result = ''
-        for x in self._symbols:
+        for x in self._symbols():
             result += x
         return result
 
@@ -87,8 +228,8 @@ class SudokuPuzzle(Puzzle):
             @rtype: str
             """
             string_list = []
-            r = round(self._n ** (1 / 2))
-            for i in range(self._n):
+            r = round(self._layout.n ** (1 / 2))
+            for i in range(self._layout.n):
                 if i > 0 and i % r == 0:
                     string_list.append("|")
                 string_list.append(row[i])
@@ -102,17 +243,18 @@ class SudokuPuzzle(Puzzle):
             @type table: list[str]
             @rtype: list[str]
             """
-            r = round(self._n ** (1 / 2))
-            t, divider = [], "-" * (self._n + r - 1)
-            for i in range(self._n):
+            r = round(self._layout.n ** (1 / 2))
+            t, divider = [], "-" * (self._layout.n + r - 1)
+            for i in range(self._layout.n):
                 if i > 0 and i % r == 0:
                     t.append(divider)
                 t.append(table[i])
             return t
 
-        rows = [row_pickets([self._symbols[r * self._n + c]
-                             for c in range(self._n)])
-                for r in range(self._n)]
+        symbols = self._symbols()
+        rows = [row_pickets([symbols[r * self._layout.n + c]
+                             for c in range(self._layout.n)])
+                for r in range(self._layout.n)]
         rows = table_dividers(rows)
         return "\n".join(rows)
 
@@ -136,21 +278,27 @@ class SudokuPuzzle(Puzzle):
         >>> s.is_solved()
         False
         """
-        # convenient names
-        n, symbols = self._n, self._symbols
-        # no "*" left and all rows, column, subsquares have correct symbols
-        return ("*" not in symbols and
-                all([(self._row_set(i) == self._symbol_set and
-                      self._column_set(i) == self._symbol_set and
-                      self._subsquare_set(i) ==
-                      self._symbol_set) for i in range(n ** 2)]))
+        full = self._layout.full
+        # no "*" left and all rows, column, subsquares have every symbol,
+        # which n positions can only have if none is repeated
+        return (0 not in self._cells and
+                all([mask == full for mask in self._rows]) and
+                all([mask == full for mask in self._columns]) and
+                all([mask == full for mask in self._subsquares]))
 
     def extensions(self):
         """
-        Return list of extensions of SudokuPuzzle self.
+        Yield the extensions of SudokuPuzzle self, after filling in every
+        symbol its grid forces (see fail_fast).  Each places a symbol
+        allowed at the empty position with the fewest, breaking ties by
+        the most empty positions sharing a row, column or subsquare with
+        it, and fills in what that forces in turn; those that contradict
+        themselves are left out.  If the forced symbols alone complete
+        the grid, that grid is the only extension; a grid that is already
+        full has none.
 
         @type self: Puzzle
-        @rtype: list[Puzzle]
+        @rtype: generator[Puzzle]
 
         >>> grid = ["A", "B", "C", "D"]
         >>> grid += ["C", "D", "A", "B"]
@@ -166,85 +314,242 @@ class SudokuPuzzle(Puzzle):
         True
         >>> all([s in L1 for s in L2])
         True
+        >>> grid = ["A", "B", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "C", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> [repr(e)[:8] for e in s.extensions()]
+        ['ABDCCD**', 'ABDCDC**']
+        >>> grid[14] = "D"
+        >>> list(SudokuPuzzle(4, grid, {"A", "B", "C", "D"}).extensions())
+        []
+        >>> list(SudokuPuzzle(4, list("ABCDCDABBADCDCBA"),
+        ...                   {"A", "B", "C", "D"}).extensions())
+        []
         """
-        # convenient names
-        symbols, symbol_set, n = self._symbols, self._symbol_set, self._n
-        if "*" not in symbols:
-            # return an empty generator
-            return [_ for _ in []]
-        else:
-            # position of first empty position
-            i = symbols.index("*")
-            # allowed symbols at position i
-            # A | B == A.union(B)
-            allowed_symbols = (self._symbol_set -
-                               (self._row_set(i) |
-                                self._column_set(i) |
-                                self._subsquare_set(i)))
-            # list of SudokuPuzzles with each legal digit at position i
-            return (
-                [SudokuPuzzle(n,
-                 symbols[:i] + [d] + symbols[i + 1:], symbol_set)
-                 for d in allowed_symbols])
+        if 0 not in self._cells:
+            return
+        puzzle = self
+        if not self._reduced:
+            puzzle = self._copy()
+            if not puzzle._propagate(puzzle._everything()):
+                return
+            if 0 not in puzzle._cells:
+                yield puzzle
+                return
+        lowest = min(puzzle._order)
+        if lowest != _FILLED and lowest >= puzzle._layout.span:
+            # most constrained empty position
+            i = puzzle._order.index(lowest)
+            # SudokuPuzzles with each legal digit at position i, built
+            # only as they are asked for
+            allowed = puzzle._allowed(i)
+            while allowed:
+                bit = allowed & -allowed
+                allowed ^= bit
+                extension, todo = puzzle._copy(), ({}, {})
+                extension._place(i, bit, todo)
+                if extension._propagate(todo):
+                    yield extension
 
     def fail_fast(self):
         """Returns true if there are no more possible moves in the soduku puzzle.
+
+        Symbols are filled in wherever they are forced, until nothing
+        changes: at a position that allows only one symbol (naked
+        single), at the only position of a row, column or subsquare that
+        allows a symbol it is missing (hidden single), and a symbol that
+        a subsquare can only have in one of its rows or columns is ruled
+        out of the rest of that row or column, and the other way round
+        (locked candidates).  It fails if any position then allows no
+        symbol, or any row, column or subsquare has nowhere left for a
+        symbol it is missing.
+
         @rtype: bool
         >>> test = SudokuPuzzle(4,['1','2','3','4','4','3','2','1','3','1','4','2','*','4','1','*'],{'1','2','3','4'})
         >>> test.fail_fast()
         False
+        >>> grid = ["*", "*", "B", "C"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["A", "*", "*", "*"]
+        >>> grid += ["*", "A", "*", "*"]
+        >>> SudokuPuzzle(4, grid, {"A", "B", "C", "D"}).fail_fast()
+        True
         """
-        return self.extensions() == []
+        if self._reduced:
+            return False
+        puzzle = self._copy()
+        return not puzzle._propagate(puzzle._everything())
 
     # some helper methods
-    def _row_set(self, m):
-        #
-        # Return set of symbols in row of SudokuPuzzle self's symbols
-        # where position m occurs.
+    def _allowed(self, m):
+        # Return the bits of the symbols allowed at position m of
+        # SudokuPuzzle self.
         #
         # @type self: SudokuPuzzle
         # @type m: int
-        assert 0 <= m < self._n ** 2
-        # convenient names
-        n, symbols = self._n, self._symbols
-        # first position in m's row
-        r = (m // n) * n
-        # set of elements from symbols[r] .. symbols[r+n-1]
-        return set([symbols[r + i] for i in range(n)])
-
-    def _column_set(self, m):
-        # Return set of symbols in column of SudokuPuzzle self's symbols
-        # where position m occurs.
+        # @rtype: int
+        row, column, subsquare = self._layout.units[m]
+        return self._layout.full & ~(self._rows[row] | self._columns[column] |
+                                     self._subsquares[subsquare] |
+                                     self._excluded.get(m, 0))
+
+    def _copy(self):
+        # Return a copy of SudokuPuzzle self that can be changed in place.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: SudokuPuzzle
+        puzzle = SudokuPuzzle.__new__(SudokuPuzzle)
+        puzzle._layout, puzzle._cells = self._layout, self._cells[:]
+        puzzle._rows, puzzle._columns = self._rows[:], self._columns[:]
+        puzzle._subsquares, puzzle._order = self._subsquares[:], \
+            self._order[:]
+        puzzle._excluded, puzzle._reduced = dict(self._excluded), False
+        return puzzle
+
+    def _place(self, m, bit, todo=None):
+        # Put the symbol of bit at empty position m of SudokuPuzzle self,
+        # bringing the order of m's empty peers up to date.  If todo is
+        # given, add to it what _propagate must look at again.
         #
         # @type self: SudokuPuzzle
         # @type m: int
-        assert 0 <= m <= self._n ** 2
-        # convenient names
-        symbols, n = self._symbols, self._n
-        # first position in m's column
-        c = m % n
-        # set of elements from symbols[c], symbols[c + n],
-        # ... symbols[c + (n * (n-1))]
-        return set([symbols[c + (i * n)] for i in range(n)])
-
-    def _subsquare_set(self, m):
-        # Return set of symbols in subsquare of SudokuPuzzle self's symbols
-        # where position m occurs.
+        # @type bit: int
+        # @type todo: (dict[int, None], dict[(int, int), None]) | None
+        # @rtype: None
+        layout = self._layout
+        span, cells, order = layout.span, self._cells, self._order
+        if todo is not None:
+            #  Each unit of m loses m as a place for its other symbols.
+            positions, units = todo
+            others = self._allowed(m) & ~bit
+            while others:
+                other = others & -others
+                others ^= other
+                for u in layout.position_units[m]:
+                    units[(u, other)] = None
+        row, column, subsquare = layout.units[m]
+        cells[m] = bit.bit_length()
+        order[m] = _FILLED
+        for p in layout.peers[m]:
+            if not cells[p]:
+                allowed = self._allowed(p)
+                if allowed & bit:
+                    #  p loses bit, and each unit of p loses p for it
+                    allowed ^= bit
+                    if todo is not None:
+                        positions[p] = None
+                        for u in layout.position_units[p]:
+                            units[(u, bit)] = None
+                #  one fewer empty peer, and perhaps one fewer symbol
+                empty = span - 1 - order[p] % span - 1
+                order[p] = _count(allowed) * span + span - 1 - empty
+        self._rows[row] |= bit
+        self._columns[column] |= bit
+        self._subsquares[subsquare] |= bit
+
+    def _exclude(self, m, bit, todo):
+        # Rule the symbol of bit out at empty position m of SudokuPuzzle
+        # self, adding to todo what _propagate must look at again, and
+        # return whether it was allowed there.
         #
-        # @type self: Sudoku Puzzle
+        # @type self: SudokuPuzzle
         # @type m: int
-        assert 0 <= m < self._n ** 2
-        # convenient names
-        n, symbols = self._n, self._symbols
-        # row, column where m occur
-        row, col = m // n, m % n
-        # length of subsquares
-        ss = round(n ** (1 / 2))
-        # upper-left position of m's subsquare
-        ul = (((row // ss) * ss) * n) + ((col // ss) * ss)
-        # return set of symbols from subsquare starting at ul
-        return set(
-            [symbols[ul + i + n * j] for i in range(ss) for j in range(ss)])
+        # @type bit: int
+        # @type todo: (dict[int, None], dict[(int, int), None])
+        # @rtype: bool
+        if not self._allowed(m) & bit:
+            return False
+        self._excluded[m] = self._excluded.get(m, 0) | bit
+        span = self._layout.span
+        self._order[m] = (_count(self._allowed(m)) * span +
+                          self._order[m] % span)
+        positions, units = todo
+        positions[m] = None
+        for u in self._layout.position_units[m]:
+            units[(u, bit)] = None
+        return True
+
+    def _used(self, u):
+        # Return the bits of the symbols used in unit u of SudokuPuzzle
+        # self, numbered as in _SudokuLayout.unit_positions.
+        #
+        # @type self: SudokuPuzzle
+        # @type u: int
+        # @rtype: int
+        n = self._layout.n
+        if u < n:
+            return self._rows[u]
+        if u < 2 * n:
+            return self._columns[u - n]
+        return self._subsquares[u - 2 * n]
+
+    def _everything(self):
+        # Return a todo for _propagate holding every empty position of
+        # SudokuPuzzle self, and every unit with each symbol it misses.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: (dict[int, None], dict[(int, int), None])
+        layout = self._layout
+        positions = {m: None for m in range(layout.n ** 2)
+                     if not self._cells[m]}
+        units = {}
+        for u in range(len(layout.unit_positions)):
+            missing = layout.full & ~self._used(u)
+            while missing:
+                bit = missing & -missing
+                missing ^= bit
+                units[(u, bit)] = None
+        return positions, units
+
+    def _propagate(self, todo):
+        # Fill in the symbols forced in SudokuPuzzle self, as fail_fast
+        # describes, looking only at the positions and (unit, symbol bit)
+        # pairs in todo and those that changes add to it.  Return False
+        # if that finds a contradiction.
+        #
+        # @type self: SudokuPuzzle
+        # @type todo: (dict[int, None], dict[(int, int), None])
+        # @rtype: bool
+        layout, cells = self._layout, self._cells
+        n, units = layout.n, layout.unit_positions
+        positions, pairs = todo
+        while positions or pairs:
+            if positions:
+                #  naked single
+                m = positions.popitem()[0]
+                if not cells[m]:
+                    allowed = self._allowed(m)
+                    if not allowed:
+                        return False
+                    if not allowed & (allowed - 1):
+                        self._place(m, allowed, todo)
+                continue
+
+            u, bit = pairs.popitem()[0]
+            if self._used(u) & bit:
+                continue
+            where = [m for m in units[u]
+                     if not cells[m] and self._allowed(m) & bit]
+            #  hidden single, or nowhere for a missing symbol
+            if not where:
+                return False
+            if len(where) == 1:
+                self._place(where[0], bit, todo)
+                continue
+            #  locked candidates: where a subsquare must have a symbol in
+            #  one row or column, or a row or column in one subsquare
+            kind = u // n
+            for other in ([0, 1] if kind == 2 else [2]):
+                lines = {layout.units[m][other] for m in where}
+                if len(lines) == 1:
+                    for p in units[other * n + lines.pop()]:
+                        if (layout.units[p][kind] != u - kind * n and
+                                not cells[p]):
+                            self._exclude(p, bit, todo)
+        self._reduced = True
+        return True
 
 
 if __name__ == "__main__":
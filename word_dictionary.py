@@ -0,0 +1,309 @@
+"""
+Compiled word lists for word-ladder puzzles.
+
+compile_dictionary turns a word list such as the "words" file into a
+binary file that open_dictionary maps into memory, so a WordLadderPuzzle
+can use it without reading or parsing the words, and every process that
+opens the same file shares its pages.
+
+The file is little-endian:
+
+    header      b"WLDX", version (u32), encoding (u32), bucket count (u32)
+    buckets     per word length L in bytes: L (u32), word count N (u32),
+                words offset (u64), index offset (u64),
+                components offset (u64)
+    words       per bucket, N words of exactly L bytes, sorted
+    index       per bucket and per position i < L, the N word numbers
+                (u32) sorted by the word with byte i left out
+    components  per bucket, the component number (u32) of each word, shared
+                by exactly the words it can be changed into one neighbour
+                at a time
+
+The index puts the words matching a pattern such as "s*me" next to each
+other, so the words one character away from a word are found with one
+binary search per character.  Words are stored as latin-1 when they all
+fit, so a byte is a character; otherwise as UTF-8, where only words
+differing in one byte count as neighbours.
+"""
+import mmap
+import struct
+from word_ladder_puzzle import WordIndex
+
+_MAGIC = b"WLDX"
+_VERSION = 3
+_ENCODINGS = ["latin-1", "utf-8"]
+_HEADER = struct.Struct("<4sIII")
+_BUCKET = struct.Struct("<IIQQQ")
+_NUMBER = struct.Struct("<I")
+
+# MappedWordSets already opened in this process, by path
+_dictionaries = {}
+
+
+def compile_dictionary(source, target):
+    """
+    Write the whitespace-separated words in the file at source to the
+    file at target in the compiled format, and return how many words
+    were written.
+
+    @type source: str
+    @type target: str
+    @rtype: int
+    """
+    with open(source, "r") as words:
+        word_set = set(words.read().split())
+    encoding = 0
+    try:
+        encoded = [word.encode(_ENCODINGS[0]) for word in word_set]
+    except UnicodeEncodeError:
+        encoding = 1
+        encoded = [word.encode(_ENCODINGS[1]) for word in word_set]
+
+    buckets = {}
+    for word in encoded:
+        buckets.setdefault(len(word), []).append(word)
+    # decoded as latin-1 each byte is one character, so these components
+    # follow the same one-byte steps as MappedWordSet.neighbours
+    components = WordIndex([word.decode("latin-1") for word in encoded])
+
+    offset = _HEADER.size + _BUCKET.size * len(buckets)
+    table, sections = [], []
+    for length in sorted(buckets):
+        words = sorted(buckets[length])
+        index = b"".join(
+            b"".join([_NUMBER.pack(number) for number in sorted(
+                range(len(words)),
+                key=lambda n: (words[n][:i] + words[n][i + 1:], n))])
+            for i in range(length))
+        labels = b"".join([_NUMBER.pack(components.component(
+            word.decode("latin-1"))) for word in words])
+        table.append(_BUCKET.pack(length, len(words), offset,
+                                  offset + length * len(words),
+                                  offset + length * len(words) + len(index)))
+        sections.extend([b"".join(words), index, labels])
+        offset += length * len(words) + len(index) + len(labels)
+
+    with open(target, "wb") as compiled:
+        compiled.write(_HEADER.pack(_MAGIC, _VERSION, encoding,
+                                    len(buckets)))
+        compiled.write(b"".join(table))
+        for section in sections:
+            compiled.write(section)
+    return len(encoded)
+
+
+def open_dictionary(path):
+    """
+    Return the MappedWordSet of the compiled dictionary at path, mapping
+    the file only the first time it is asked for in this process.
+
+    @type path: str
+    @rtype: MappedWordSet
+    """
+    dictionary = _dictionaries.get(path)
+    if dictionary is None:
+        dictionary = _dictionaries[path] = MappedWordSet(path)
+    return dictionary
+
+
+class MappedWordSet:
+    """
+    A read-only set of words backed by a memory-mapped compiled
+    dictionary, which also finds the words one character away from a
+    word.  It can be used as the word set of a WordLadderPuzzle.
+    """
+
+    def __init__(self, path):
+        """
+        Create a new MappedWordSet self over the compiled dictionary at
+        path.
+
+        @type self: MappedWordSet
+        @type path: str
+        @rtype: None
+        """
+        self.path = path
+        with open(path, "rb") as compiled:
+            self._map = mmap.mmap(compiled.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, version, encoding, count = _HEADER.unpack_from(self._map, 0)
+        assert magic == _MAGIC and version == _VERSION
+        self._encoding = _ENCODINGS[encoding]
+        # (word count, words offset, index offset, components offset) by
+        # word length
+        self._buckets = {}
+        for b in range(count):
+            bucket = _BUCKET.unpack_from(self._map,
+                                         _HEADER.size + b * _BUCKET.size)
+            self._buckets[bucket[0]] = bucket[1:]
+
+    def __reduce__(self):
+        """
+        Pickle MappedWordSet self as its path, so the file is mapped
+        again, not copied, by the process that unpickles it.
+
+        @type self: MappedWordSet
+        @rtype: tuple
+        """
+        return open_dictionary, (self.path,)
+
+    def __len__(self):
+        """
+        Return the number of words in MappedWordSet self.
+
+        @type self: MappedWordSet
+        @rtype: int
+        """
+        return sum([bucket[0] for bucket in self._buckets.values()])
+
+    def __iter__(self):
+        """
+        Yield the words of MappedWordSet self, shortest first.
+
+        @type self: MappedWordSet
+        @rtype: generator[str]
+        """
+        for length in sorted(self._buckets):
+            words, words_at = self._buckets[length][:2]
+            for n in range(words):
+                start = words_at + n * length
+                yield self._map[start:start + length].decode(self._encoding)
+
+    def __contains__(self, word):
+        """
+        Return whether word is in MappedWordSet self.
+
+        @type self: MappedWordSet
+        @type word: str
+        @rtype: bool
+        """
+        try:
+            encoded = word.encode(self._encoding)
+        except UnicodeEncodeError:
+            return False
+        return self._number(encoded) is not None
+
+    def _number(self, encoded):
+        # Return the number of encoded word in its bucket, or None if it
+        # is not in MappedWordSet self.
+        #
+        # @type self: MappedWordSet
+        # @type encoded: bytes
+        # @rtype: int | None
+        bucket = self._buckets.get(len(encoded))
+        if bucket is None:
+            return None
+        words, words_at = bucket[:2]
+        length, low, high = len(encoded), 0, words
+        while low < high:
+            middle = (low + high) // 2
+            start = words_at + middle * length
+            if self._map[start:start + length] < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        start = words_at + low * length
+        if low < words and self._map[start:start + length] == encoded:
+            return low
+        return None
+
+    def component(self, word):
+        """
+        Return the component number of word, shared by exactly the words
+        it can be changed into one step of neighbours at a time, or None
+        if word is not in MappedWordSet self.  For a UTF-8 dictionary a
+        step changes one byte, so words of different lengths in bytes
+        never share a number.
+
+        @type self: MappedWordSet
+        @type word: str
+        @rtype: int | None
+
+        >>> import os, tempfile
+        >>> source = os.path.join(tempfile.mkdtemp(), "words")
+        >>> with open(source, "w") as words:
+        ...     _ = words.write("test best ţest ţast")
+        >>> _ = compile_dictionary(source, source + ".wld")
+        >>> dictionary = open_dictionary(source + ".wld")
+        >>> dictionary.component("test") == dictionary.component("best")
+        True
+        >>> dictionary.component("test") == dictionary.component("ţest")
+        False
+        """
+        try:
+            encoded = word.encode(self._encoding)
+        except UnicodeEncodeError:
+            return None
+        n = self._number(encoded)
+        if n is None:
+            return None
+        components_at = self._buckets[len(encoded)][3]
+        return _NUMBER.unpack_from(self._map,
+                                   components_at + n * _NUMBER.size)[0]
+
+    def neighbours(self, word):
+        """
+        Yield the words of MappedWordSet self that differ from word in
+        exactly one character.
+
+        @type self: MappedWordSet
+        @type word: str
+        @rtype: generator[str]
+        """
+        try:
+            encoded = word.encode(self._encoding)
+        except UnicodeEncodeError:
+            return
+        length = len(encoded)
+        bucket = self._buckets.get(length)
+        if bucket is None:
+            return
+        words, words_at, index_at = bucket[:3]
+        table, number = self._map, _NUMBER.unpack_from
+
+        for i in range(length):
+            pattern = encoded[:i] + encoded[i + 1:]
+            order_at = index_at + i * words * _NUMBER.size
+            #  Find the first word in position i order matching pattern.
+            low, high = 0, words
+            while low < high:
+                middle = (low + high) // 2
+                start = words_at + number(
+                    table, order_at + middle * _NUMBER.size)[0] * length
+                if (table[start:start + i] +
+                        table[start + i + 1:start + length]) < pattern:
+                    low = middle + 1
+                else:
+                    high = middle
+            while low < words:
+                start = words_at + number(
+                    table, order_at + low * _NUMBER.size)[0] * length
+                candidate = table[start:start + length]
+                if candidate[:i] + candidate[i + 1:] != pattern:
+                    break
+                if candidate != encoded:
+                    yield candidate.decode(self._encoding)
+                low += 1
+
+
+if __name__ == "__main__":
+    import sys
+    from time import time
+
+    if len(sys.argv) == 3:
+        print("compiled {} words".format(
+            compile_dictionary(sys.argv[1], sys.argv[2])))
+    else:
+        start = time()
+        compile_dictionary("words", "words.wld")
+        print("compiled words in {} seconds".format(time() - start))
+
+        from word_ladder_puzzle import WordLadderPuzzle
+        from puzzle_tools import breadth_first_solve
+        start = time()
+        word_set = open_dictionary("words.wld")
+        sol = breadth_first_solve(WordLadderPuzzle("same", "cost", word_set))
+        end = time()
+        print("Solving word ladder from same->cost from a compiled "
+              "dictionary")
+        print("Solutions: {} took {} seconds.".format(sol, end - start))
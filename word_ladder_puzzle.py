@@ -1,10 +1,248 @@
+import weakref
 from puzzle import Puzzle
 
+# word sets read by load_word_set, by file name, and the file name of each
+# by id, so puzzles using them can be pickled without the words
+_word_sets = {}
+_word_set_paths = {}
+
+
+def load_word_set(path):
+    """
+    Return the set of whitespace-separated words in the file at path,
+    reading the file only the first time it is asked for in this process.
+
+    Pass this as the initializer of a worker pool to give every worker
+    one copy of the words; WordLadderPuzzles using the set are then sent
+    to the workers without it.
+
+    @type path: str
+    @rtype: set[str]
+
+    >>> load_word_set("wordstest.txt") is load_word_set("wordstest.txt")
+    True
+    >>> sorted(load_word_set("wordstest.txt"))[:2]
+    ['came', 'come']
+    """
+    word_set = _word_sets.get(path)
+    if word_set is None:
+        with open(path, "r") as words:
+            word_set = set(words.read().split())
+        _word_sets[path] = word_set
+        _word_set_paths[id(word_set)] = path
+    return word_set
+
+
+# WordIndex of each word set, by id, dropped when the word set is
+_word_indexes = {}
+# WordIndex of each word set in use that cannot be weakly referenced, such
+# as a list, by id; such an index holds its word set, so the id cannot be
+# reused while the entry is there
+_held_indexes = weakref.WeakValueDictionary()
+
+
+def word_index(ws):
+    """
+    Return the WordIndex of ws, building it the first time ws is used
+    so that every puzzle sharing ws shares one index.  A word set that
+    finds neighbours itself, such as a MappedWordSet, is its own index.
+
+    The index lasts as long as ws, or for a list or other word set that
+    cannot be weakly referenced, as long as something holds the index.
+    ws must not change once it has been used by a puzzle.
+
+    @type ws: set[str] | WordIndex | MappedWordSet
+    @rtype: WordIndex | MappedWordSet
+
+    >>> ws = {"same", "came", "cost"}
+    >>> word_index(ws) is word_index(ws)
+    True
+    >>> import gc
+    >>> _ = gc.collect()
+    >>> id(ws) in _word_indexes
+    True
+    >>> import pickle
+    >>> before = len(_word_indexes)
+    >>> for _ in range(3):
+    ...     copy = pickle.loads(pickle.dumps(WordLadderPuzzle("same", "cost",
+    ...                                                       ws)))
+    >>> len(_word_indexes) - before
+    1
+    """
+    if hasattr(ws, "neighbours"):
+        return ws
+    index = _word_indexes.get(id(ws))
+    if index is None:
+        index = _held_indexes.get(id(ws))
+    if index is None:
+        index = WordIndex(ws)
+        try:
+            weakref.finalize(ws, _word_indexes.pop, id(ws), None)
+        except TypeError:
+            index._words = ws
+            _held_indexes[id(ws)] = index
+        else:
+            _word_indexes[id(ws)] = index
+    return index
+
+
+class WordIndex:
+    """
+    Index of a word set by wildcard patterns, such as "s*me" for "same"
+    and "some", for finding the words one character away from a word.
+    """
+
+    def __init__(self, ws):
+        """
+        Create a new WordIndex self of the words in ws.
+
+        @type self: WordIndex
+        @type ws: set[str]
+        @rtype: None
+        """
+        # ws, when word_index keeps self in _held_indexes, so its id is not
+        # reused while self is there
+        self._words = None
+        self._patterns = {}
+        # component number of each word, once component is first asked for
+        self._components = None
+        for word in ws:
+            for x in range(len(word)):
+                pattern = word[:x] + "*" + word[x + 1:]
+                if pattern in self._patterns:
+                    self._patterns[pattern].append(word)
+                else:
+                    self._patterns[pattern] = [word]
+
+    def component(self, word):
+        """
+        Return a number shared by exactly the indexed words that word can
+        be changed into one character at a time, or None if word is not
+        indexed.
+
+        The numbers are worked out the first time they are asked for.
+
+        @type self: WordIndex
+        @type word: str
+        @rtype: int | None
+
+        >>> index = WordIndex({"same", "some", "came", "cost"})
+        >>> index.component("came") == index.component("some")
+        True
+        >>> index.component("came") == index.component("cost")
+        False
+        >>> index.component("case") is None
+        True
+        """
+        if self._components is None:
+            #  Union the words of each pattern, then number the roots.
+            parents = {}
+
+            def root(w):
+                while parents[w] != w:
+                    parents[w] = parents[parents[w]]
+                    w = parents[w]
+                return w
+
+            for words in self._patterns.values():
+                for w in words:
+                    parents.setdefault(w, w)
+                first = root(words[0])
+                for w in words[1:]:
+                    parents[root(w)] = first
+            numbers, self._components = {}, {}
+            for w in parents:
+                self._components[w] = numbers.setdefault(root(w), len(numbers))
+        return self._components.get(word)
+
+    def neighbours(self, word):
+        """
+        Yield the indexed words that differ from word in exactly one
+        character.
+
+        @type self: WordIndex
+        @type word: str
+        @rtype: generator[str]
+
+        >>> index = WordIndex({"same", "some", "came", "cost"})
+        >>> sorted(index.neighbours("same"))
+        ['came', 'some']
+        """
+        patterns = self._patterns
+        for x in range(len(word)):
+            for neighbour in patterns.get(word[:x] + "*" + word[x + 1:], ()):
+                if neighbour != word:
+                    yield neighbour
+
+
+# _LadderContext of each target word and word set in use, by (target, id);
+# a context holds its word set, as _held_indexes entries do
+_contexts = weakref.WeakValueDictionary()
+
+
+def _ladder_context(to_word, ws):
+    """
+    Return the _LadderContext shared by every WordLadderPuzzle working
+    towards to_word with ws.
+
+    @type to_word: str
+    @type ws: set[str] | MappedWordSet
+    @rtype: _LadderContext
+    """
+    context = _contexts.get((to_word, id(ws)))
+    if context is None:
+        context = _contexts[(to_word, id(ws))] = _LadderContext(to_word, ws)
+    return context
+
+
+# _LadderContext._component before it is worked out; not the context itself,
+# which would keep the context alive after its last puzzle
+_UNKNOWN = object()
+
+
+class _LadderContext:
+    """
+    What every WordLadderPuzzle of one ladder shares: the target word,
+    the word set, its index, and the alphabet, so each puzzle only holds
+    its own word and this context.
+    """
+    __slots__ = ("to_word", "word_set", "index", "chars", "_component",
+                 "__weakref__")
+
+    def __init__(self, to_word, ws):
+        """
+        Create a new _LadderContext self towards to_word with words ws.
+
+        @type self: _LadderContext
+        @type to_word: str
+        @type ws: set[str] | MappedWordSet
+        @rtype: None
+        """
+        self.to_word, self.word_set = to_word, ws
+        self.index = word_index(ws)
+        # set of characters to use for 1-character changes
+        self.chars = "abcdefghijklmnopqrstuvwxyz"
+        # _UNKNOWN until worked out, since None means the target is missing
+        self._component = _UNKNOWN
+
+    def component(self):
+        """
+        Return the component number of the target word, or None if it is
+        not in the word set, working it out only once.
+
+        @type self: _LadderContext
+        @rtype: int | None
+        """
+        if self._component is _UNKNOWN:
+            self._component = self.index.component(self.to_word)
+        return self._component
+
 
 class WordLadderPuzzle(Puzzle):
     """
     A word-ladder puzzle that may be solved, unsolved, or even unsolvable.
     """
+    __slots__ = ("_from_word", "_context")
 
     def __init__(self, from_word, to_word, ws):
         """
@@ -17,10 +255,67 @@ class WordLadderPuzzle(Puzzle):
         @type ws: set[str]
         @rtype: None
         """
-        (self._from_word, self._to_word, self._word_set) = (from_word,
-                                                            to_word, ws)
-        # set of characters to use for 1-character changes
-        self._chars = "abcdefghijklmnopqrstuvwxyz"
+        self._from_word = from_word
+        self._context = _ladder_context(to_word, ws)
+
+    @property
+    def _to_word(self):
+        """The target word, kept in the shared context."""
+        return self._context.to_word
+
+    @_to_word.setter
+    def _to_word(self, to_word):
+        self._context = _ladder_context(to_word, self._context.word_set)
+
+    @property
+    def _word_set(self):
+        """The word set, kept in the shared context."""
+        return self._context.word_set
+
+    @property
+    def _chars(self):
+        """The alphabet, kept in the shared context."""
+        return self._context.chars
+
+    def _step(self, word):
+        # Return a WordLadderPuzzle at word sharing the context of
+        # WordLadderPuzzle self.
+        #
+        # @type self: WordLadderPuzzle
+        # @type word: str
+        # @rtype: WordLadderPuzzle
+        step = WordLadderPuzzle.__new__(WordLadderPuzzle)
+        step._from_word, step._context = word, self._context
+        return step
+
+    def __getstate__(self):
+        """Returns what to pickle, naming the file of a word set from
+        load_word_set instead of including its words.
+
+        @rtype: tuple
+        """
+        ws = self._context.word_set
+        path = _word_set_paths.get(id(ws))
+        if path is not None:
+            return self._from_word, self._context.to_word, path, True
+        return self._from_word, self._context.to_word, ws, False
+
+    def __setstate__(self, state):
+        """Restores a pickled puzzle, loading a named word set.
+
+        @type state: tuple
+        @rtype: None
+        >>> import pickle
+        >>> ws = load_word_set("wordstest.txt")
+        >>> copy = pickle.loads(pickle.dumps(WordLadderPuzzle('same', 'cost', ws)))
+        >>> copy._word_set is ws
+        True
+        """
+        from_word, to_word, ws, is_path = state
+        if is_path:
+            ws = load_word_set(ws)
+        self._from_word = from_word
+        self._context = _ladder_context(to_word, ws)
 
     def __eq__(self, other):
         """Returns true if this puzzle is equal to the other puzzle and false otherwise.
@@ -38,6 +333,22 @@ class WordLadderPuzzle(Puzzle):
         return self._from_word == other._from_word and self._to_word == other._to_word
         # implement __eq__ and __str__
 
+    def __hash__(self):
+        """Returns a hash consistent with __eq__.
+
+        @rtype: int
+        """
+        return hash(self.state_key())
+
+    def state_key(self):
+        """Returns the current word, which identifies the configuration.
+
+        @rtype: str
+        >>> WordLadderPuzzle('case', 'test', ['case', 'test']).state_key()
+        'case'
+        """
+        return self._from_word
+
     def __str__(self):
         """Returns a human readable string representation of the string.
 
@@ -60,20 +371,29 @@ class WordLadderPuzzle(Puzzle):
         return self._from_word
 
     def fail_fast(self):
-        """
+        """Returns true if the target word can't be reached: the words differ
+        in length, either is missing from the word set, or they are in
+        different components of the one-character-change graph.
 
-        @return:
-        >>> test_word = 'dome'
-        >>> to_word = 'bong'
+        @rtype: bool
         >>> ws = ['come','dome','bong']
-        >>> w = WordLadderPuzzle(test_word,to_word,ws)
-        >>> w.fail_fast()
+        >>> WordLadderPuzzle('dome', 'come', ws).fail_fast()
         False
-        >>> w._from_word = w._to_word
-        >>> w.fail_fast()
+        >>> WordLadderPuzzle('dome', 'bong', ws).fail_fast()
+        True
+        >>> WordLadderPuzzle('dome', 'dame', ws).fail_fast()
+        True
+        >>> WordLadderPuzzle('dome', 'do', ws).fail_fast()
         True
         """
-        return self.extensions() == []
+        context = self._context
+        if self._from_word == context.to_word:
+            return False
+        if len(self._from_word) != len(context.to_word):
+            return True
+        component = context.component()
+        return (component is None or
+                context.index.component(self._from_word) != component)
 
     def extensions(self):
         """
@@ -83,7 +403,7 @@ class WordLadderPuzzle(Puzzle):
         >>> to_word = 'bong'
         >>> ws = ['come','dome','bong']
         >>> w = WordLadderPuzzle(test_word,to_word,ws)
-        >>> L1 = w.extensions()
+        >>> L1 = list(w.extensions())
         >>> result = 'come'
         >>> check = WordLadderPuzzle(result, to_word, ws)
         >>> check in L1
@@ -95,27 +415,40 @@ class WordLadderPuzzle(Puzzle):
         False
         """
 
-        extension = []
+        for temp_word in self._context.index.neighbours(self._from_word):
+            yield self._step(temp_word)
 
-        for x in range(len(self._from_word)):
-            word_list = list(self._from_word)
-            #  Parse the word into a list of characters.
-            del word_list[x]
-            #  Delete a character from the word
-            for temp_word in self._word_set:
-                if len(temp_word) == len(self._from_word) and temp_word != self._from_word:
-                    #  Trap for words that are not the same length
-                    temp_list = list(temp_word)
+        # one dictionary lookup per character of the word.
 
-                    del temp_list[x]
-                    if temp_list == word_list:
-                        extension.append(WordLadderPuzzle(temp_word, self._to_word, self._word_set))
+    def is_reversible(self):
+        """Changing the same character back undoes every step.
 
-                        #  Compare dictionary with word
+        @rtype: bool
+        """
+        return True
 
-        return extension
+    def goal(self):
+        """Returns the WordLadderPuzzle already at the target word.
 
-        # length of the word * word set comparisons.
+        @rtype: WordLadderPuzzle
+        >>> WordLadderPuzzle('same', 'cost', ['same', 'cost']).goal()
+        cost
+        """
+        return self._step(self._context.to_word)
+
+    def heuristic(self):
+        """Returns the number of positions where the current word differs
+        from the target word, since each step changes one character.
+
+        @rtype: int
+        >>> WordLadderPuzzle('same', 'cost', ['same', 'cost']).heuristic()
+        4
+        """
+        mismatches = abs(len(self._from_word) - len(self._to_word))
+        for x in range(min(len(self._from_word), len(self._to_word))):
+            if self._from_word[x] != self._to_word[x]:
+                mismatches += 1
+        return mismatches
 
     def is_solved(self):
         """Returns true if the current word ladder is solved and false otherwise.
@@ -131,16 +464,16 @@ class WordLadderPuzzle(Puzzle):
         # override is_solved
         # this WordLadderPuzzle is solved when _from_word is the same as
         # _to_word
-        return self._from_word == self._to_word
+        return self._from_word == self._context.to_word
 
 
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
-    from puzzle_tools import breadth_first_solve, depth_first_solve
+    from puzzle_tools import breadth_first_solve, depth_first_solve, \
+        bidirectional_solve, all_shortest_solve
     from time import time
-    with open("words", "r") as words:
-        word_set = set(words.read().split())
+    word_set = load_word_set("words")
     w = WordLadderPuzzle("same", "cost", word_set)
     start = time()
     sol = breadth_first_solve(w)
@@ -154,3 +487,14 @@ if __name__ == '__main__':
     print("Solving word ladder from same->cost")
     print("...using depth-first-search")
     print("Solutions: {} took {} seconds.".format(sol, end - start))
+    start = time()
+    sol = bidirectional_solve(w)
+    end = time()
+    print("Solving word ladder from same->cost")
+    print("...using bidirectional-search")
+    print("Solutions: {} took {} seconds.".format(sol, end - start))
+    start = time()
+    sols = list(all_shortest_solve(w))
+    end = time()
+    print("Found all {} shortest word ladders from same->cost "
+          "in {} seconds.".format(len(sols), end - start))
@@ -0,0 +1,199 @@
+"""
+A long-running word-ladder query server.
+
+The word set and its index are loaded once.  Clients connect over TCP
+or a Unix socket and send one JSON query per line:
+
+    {"id": 1, "from": "same", "to": "cost"}
+
+and get one JSON answer per line, in the order they finish:
+
+    {"id": 1, "from": "same", "to": "cost",
+     "path": ["same", "came", "case", "cast", "cost"], "seconds": 0.002}
+
+"path" is null when there is no ladder.  Solves run in a bounded pool of
+worker processes, each given the word set and building its index once,
+and a query that is already being solved waits for that answer instead
+of being solved again.
+"""
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from word_ladder_puzzle import WordLadderPuzzle, load_word_set, word_index
+from puzzle_tools import bidirectional_solve
+
+# the word set of this worker process, set by _start_worker
+_worker_word_set = None
+
+
+def _start_worker(ws):
+    # Keep ws as the word set of this worker process and build its index
+    # and components, once, before the first query.
+    #
+    # @type ws: set[str] | MappedWordSet
+    # @rtype: None
+    global _worker_word_set
+    _worker_word_set = ws
+    word_index(ws).component("")
+
+
+def _solve(from_word, to_word):
+    # Return (words on a shortest ladder or None, seconds taken), in a
+    # worker process.
+    #
+    # @type from_word: str
+    # @type to_word: str
+    # @rtype: (list[str] | None, float)
+    start = perf_counter()
+    node = bidirectional_solve(WordLadderPuzzle(from_word, to_word,
+                                                _worker_word_set))
+    words = None
+    if node is not None:
+        words = [node.puzzle.state_key()]
+        while node.children:
+            node = node.children[0]
+            words.append(node.puzzle.state_key())
+    return words, perf_counter() - start
+
+
+class LadderServer:
+    """
+    Answers word-ladder queries against one word set.
+
+    === Attributes ===
+    @type queries: int
+        queries answered
+    @type coalesced: int
+        queries answered by waiting on an identical query in flight
+    """
+
+    def __init__(self, ws, workers=4):
+        """
+        Create a new LadderServer self for word set ws, solving at most
+        workers queries at once, each in its own process.
+
+        @type self: LadderServer
+        @type ws: set[str] | MappedWordSet
+        @type workers: int
+        @rtype: None
+        """
+        self._word_set = ws
+        self._executor = ProcessPoolExecutor(workers, initializer=_start_worker,
+                                             initargs=(ws,))
+        #  Start the workers now, so they build the index before the first
+        #  query.
+        self._executor.submit(int).result()
+        # futures of the (from, to) queries being solved
+        self._in_flight = {}
+        self.queries, self.coalesced = 0, 0
+
+    async def answer(self, query):
+        """
+        Return the answer to query, a dict with "from" and "to" words and
+        optionally an "id" to echo.
+
+        @type self: LadderServer
+        @type query: dict
+        @rtype: dict
+
+        >>> server = LadderServer({"same", "came", "case", "cast", "cost"})
+        >>> answer = asyncio.run(server.answer({"from": "same", "to": "cost"}))
+        >>> answer["path"]
+        ['same', 'came', 'case', 'cast', 'cost']
+        """
+        key = (query["from"], query["to"])
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, _solve, key[0], key[1])
+            self._in_flight[key] = future
+            future.add_done_callback(
+                lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        words, seconds = await asyncio.shield(future)
+        self.queries += 1
+        return {"id": query.get("id"), "from": key[0], "to": key[1],
+                "path": words, "seconds": seconds}
+
+    async def _reply(self, line, writer):
+        # Answer one query line on writer.
+        #
+        # @type self: LadderServer
+        # @type line: bytes
+        # @type writer: asyncio.StreamWriter
+        # @rtype: None
+        try:
+            query = json.loads(line)
+            reply = await self.answer(query)
+        except (ValueError, KeyError, TypeError) as error:
+            reply = {"error": "bad query: {}".format(error)}
+        writer.write(json.dumps(reply).encode() + b"\n")
+
+    async def handle(self, reader, writer):
+        """
+        Answer the query lines of one client until it disconnects.
+
+        @type self: LadderServer
+        @type reader: asyncio.StreamReader
+        @type writer: asyncio.StreamWriter
+        @rtype: None
+        """
+        replies = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    reply = asyncio.ensure_future(self._reply(line, writer))
+                    replies.add(reply)
+                    reply.add_done_callback(replies.discard)
+                    await writer.drain()
+            if replies:
+                await asyncio.wait(replies)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        """
+        Serve clients on the Unix socket at path, or on TCP host:port if
+        path is None, until cancelled.
+
+        @type self: LadderServer
+        @type host: str
+        @type port: int
+        @type path: str | None
+        @rtype: None
+        """
+        if path is None:
+            server = await asyncio.start_server(self.handle, host, port)
+        else:
+            server = await asyncio.start_unix_server(self.handle, path)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--words", default="words",
+                        help="word file, or compiled .wld dictionary")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="serve on this Unix socket instead")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.words.endswith(".wld"):
+        from word_dictionary import open_dictionary
+        word_set = open_dictionary(args.words)
+    else:
+        word_set = load_word_set(args.words)
+    ladder_server = LadderServer(word_set, args.workers)
+    print("serving {} on {}".format(
+        args.words, args.unix or "{}:{}".format(args.host, args.port)))
+    asyncio.run(ladder_server.serve(args.host, args.port, args.unix))
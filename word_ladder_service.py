@@ -0,0 +1,125 @@
+"""
+Answer repeated word-ladder queries from cached breadth-first trees.
+"""
+from collections import OrderedDict
+from sys import getsizeof
+from word_ladder_puzzle import WordLadderPuzzle, word_index
+from puzzle_tools import _build_path
+
+
+class LadderService:
+    """
+    Word-ladder solver for one word set that remembers, for recently used
+    target words, the next step towards the target from every word that
+    can reach it.  A query towards a remembered target just follows those
+    steps.
+
+    === Attributes ===
+    @type hits: int
+        queries answered from a remembered target
+    @type misses: int
+        queries that needed a new breadth-first search
+    @type evictions: int
+        targets forgotten to stay within budget
+    """
+
+    def __init__(self, ws, budget=64 * 2 ** 20):
+        """
+        Create a new LadderService self for word set ws that remembers
+        targets until their trees take more than budget bytes.
+
+        @type self: LadderService
+        @type ws: set[str] | MappedWordSet
+        @type budget: int
+        @rtype: None
+        """
+        self._word_set, self._budget = ws, budget
+        # held so the index lasts as long as self
+        self._index = word_index(ws)
+        # next step towards each target, by target, least recently used
+        # first, and the bytes each tree takes
+        self._trees, self._sizes, self._used = OrderedDict(), {}, 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def solve(self, from_word, to_word):
+        """
+        Return a shortest path from PuzzleNode(WordLadderPuzzle(from_word,
+        to_word, ws)) to a PuzzleNode containing a solution, or None if
+        there is none.
+
+        @type self: LadderService
+        @type from_word: str
+        @type to_word: str
+        @rtype: PuzzleNode | None
+
+        >>> service = LadderService({"same", "came", "come", "cost",
+        ...                          "cast", "case"})
+        >>> path = service.solve("same", "cost")
+        >>> path = service.solve("come", "cost")
+        >>> while path.children:
+        ...     path = path.children[0]
+        >>> path.puzzle.is_solved(), service.hits, service.misses
+        (True, 1, 1)
+        >>> service.solve("same", "zzzz") is None
+        True
+        """
+        puzzle = WordLadderPuzzle(from_word, to_word, self._word_set)
+        if puzzle.fail_fast():
+            return None
+        steps = self._tree(to_word)
+        if from_word not in steps:
+            return None
+        puzzles = [puzzle]
+        while from_word != to_word:
+            from_word = steps[from_word]
+            puzzles.append(WordLadderPuzzle(from_word, to_word,
+                                            self._word_set))
+        return _build_path(puzzles)
+
+    def stats(self):
+        """
+        Return the cache counters and size of LadderService self.
+
+        @type self: LadderService
+        @rtype: dict[str, int]
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "targets": len(self._trees),
+                "bytes": self._used}
+
+    def _tree(self, to_word):
+        # Return the next step towards to_word from every word that can
+        # reach it, searching breadth-first from to_word if it is not
+        # remembered.
+        #
+        # @type self: LadderService
+        # @type to_word: str
+        # @rtype: dict[str, str]
+        steps = self._trees.get(to_word)
+        if steps is not None:
+            self.hits += 1
+            self._trees.move_to_end(to_word)
+            return steps
+
+        self.misses += 1
+        index = self._index
+        steps, layer = {to_word: None}, [to_word]
+        while layer:
+            next_layer = []
+            for word in layer:
+                for neighbour in index.neighbours(word):
+                    if neighbour not in steps:
+                        steps[neighbour] = word
+                        next_layer.append(neighbour)
+            layer = next_layer
+
+        # count the words too, since a MappedWordSet makes new strings
+        size = getsizeof(steps) + sum([getsizeof(word) for word in steps])
+        if size <= self._budget:
+            while self._used + size > self._budget:
+                forgotten, _ = self._trees.popitem(last=False)
+                self._used -= self._sizes.pop(forgotten)
+                self.evictions += 1
+            self._trees[to_word], self._sizes[to_word] = steps, size
+            self._used += size
+        return steps